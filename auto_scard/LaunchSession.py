@@ -4,18 +4,29 @@
 # @Author  :Jason cao
 # @File    :scard.py
 
-import pyautogui
 import os
 import sys
-import time
-import subprocess
 import logging
 import logging.handlers
 import ConfigParser
 
+import prepare
+import sessionapi
+import pinwatcher
+import recorder
+import failfast
+import profiling
+import settle
+import robot
 
 logger = ""
 
+# the flow drives the screen, sleeps and starts processes through the switches of robot.py,
+# recording, replay and profiling change them there
+pyautogui  = robot.gui
+time       = robot.clock
+subprocess = robot.shell
+
 
 citrix_receiver_desktops_x = 1025
 citrix_receiver_desktops_y =92
@@ -31,9 +42,81 @@ vda_pin_ok_button_y = 555
 
 proc_wait_time = 30
 opt_wait_time  = 5
+pin_grace_time = 3
+
+# process of the client which opens the ica file of the launch
+ica_client     = 'wfica32.exe'
+
+run_mode       = "sync"
+template_names = ['desktops.png', 'apps.png']
+template_phase = None
+
+user_name      = ""
+store_url      = ""
+store_domain   = ""
+store_password = ""
+record_file    = ""
+record_error   = -1
+profile        = 0
+
+
+def close_record(code):
+	# the record and profile files must be closed, otherwise they can not be read
+	if isinstance(robot.gui.target, recorder.Recorder):
+		robot.gui.close(code)
+	profiling.stop()
+
+
+def exit_robot(code):
+	close_record(code)
+	os._exit(code)
+
+
+def run_flow(flow, *args):
+	# a known failure state ends the flow at once with its own code
+	failfast.reset()
+	try:
+		return flow(*args)
+	except failfast.FailFastError as e:
+		logger.info('[%s] failed fast due to [%s].' % (flow.__name__, e))
+		return e.code
+
+
+def bind_display(display):
+	# the flow drives the screen and input of this display, by default the one bound already
+	if display != None:
+		robot.bind(display)
+	if robot.display != None:
+		logger.info('display is [%s].' % (robot.display.name))
+
+
+def wait_ica_handoff(VDA_name):
+	# the client took over the launch when it runs or its Desktop Viewer is open
+	for i in range(0, proc_wait_time):
+		if pyautogui.getWindow(VDA_name) != None or failfast.process_running(ica_client):
+			logger.info('ica file handed to the client.')
+			return True
+		failfast.wait(1, 'launch')
+	logger.info('client did not start in [%d] seconds.' % (proc_wait_time))
+	return False
 
 
-def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
+def window_region(win):
+	# (left, top, width, height) of a window for screen capture
+	left, top, right, bottom = win.get_position()
+	return (left, top, right - left, bottom - top)
+
+
+def get_template(name):
+	# preloaded image of the async preload phase, otherwise the file name
+	if template_phase != None:
+		templates = template_phase.wait()
+		if templates != None and name in templates:
+			return templates[name]
+	return name
+
+
+def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd, display=None):
 
 	global citrix_receiver_desktops_x, citrix_receiver_desktops_y
 	global vda_pin_center_x, vda_pin_center_y
@@ -63,7 +146,9 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 	status = 0
 	
 	logger.info('Resource type is [%s] and app name is [%s].' % (resourcetype, app_name))  
+	bind_display(display)
 	logger.info('@@@@@@@@@@@@@@@ start ...')  
+	profiling.mark('start_ie')
 	try:
 		#o = subprocess.check_output("start iexplore.exe https://sf.zhusl.com/Citrix/storeWeb/", shell=True)
 		check_cmd = "start iexplore.exe " + ddc_url
@@ -78,7 +163,8 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 	
 	logger.info("")
 	
-	time.sleep(5)
+	profiling.mark('logon')
+	failfast.wait(5, 'logon')
 	
 	win = None
 	for i in range(0, 61):
@@ -89,7 +175,7 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 		if win == None:
 			#print "cannot find Windows Security dialog"
 			logger.info('can not find Windows Security dialog.')
-			time.sleep(1)
+			failfast.wait(1, 'logon')
 			continue
 		elif win != None:
 			#print "Find Windows Security dialog"
@@ -110,8 +196,11 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 	
 	logger.info("")
 	
+	profiling.mark('pin_check')
 	logger.info('PIN password input success, start sleep...')
-	time.sleep(10)
+	# the dialog closes a moment after a correct PIN, still open after the grace time means the PIN is rejected
+	failfast.wait(pin_grace_time, 'logon')
+	failfast.wait(max(0, 10 - pin_grace_time), 'pin_check')
 	logger.info('PIN password input success, sleep end.')
 	
 	win = None
@@ -123,16 +212,17 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 		if win == None:
 			#print "cannot find Windows Security dialog"
 			logger.info('PIN password is correct.')
-			time.sleep(1)
+			failfast.wait(1, 'pin_check')
 			continue
 		elif win != None:
-			os.system("taskkill /F /IM iexplorer.exe")
+			subprocess.call("taskkill /F /IM iexplorer.exe", shell=True)
 			time.sleep(1)
 			logger.info('PIN password is not correct.')
 			return 1001
 	
 	logger.info("")
 	
+	profiling.mark('open_resource')
 	d1,h1=pyautogui.position()
 	logger.info('current mouse w-d is [%d - %d].' % (d1, h1))
 	
@@ -145,8 +235,8 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 	
 	if resourcetype == 'desktop':
 		logger.info('start screen search...')
-		loc = pyautogui.locateOnScreen('desktops.png')
-		logger.info('screen search result is [%s]' % (loc))
+		loc = pyautogui.locateOnScreen(get_template('desktops.png'))
+		logger.info('screen search result is [%s]' % (str(loc)))
 		if loc == None:
 			#print "Can not find icon for desktops."
 			logger.info('Can not find icon for desktops.')
@@ -160,12 +250,12 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 		else:
 			x, y = pyautogui.center(loc)
 			#print x, y
-			logger.info('desktops x and y is [%d - %d].' %(x, Y))
+			logger.info('desktops x and y is [%d - %d].' %(x, y))
 			#print "click desktop"
 			logger.info('click desktop.')
 			pyautogui.click(x, y)
 	elif resourcetype == 'apps':
-		loc = pyautogui.locateOnScreen('apps.png')
+		loc = pyautogui.locateOnScreen(get_template('apps.png'))
 		if loc == None:
 			#print "Cannot find icon for apps."
 			logger.info('Cannot find icon for apps.')
@@ -174,16 +264,17 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 		else:
 			x, y = pyautogui.center(loc)
 			#print x,y
-			logger.info('apps x and y is [%d - %d].' %(x, Y))
+			logger.info('apps x and y is [%d - %d].' %(x, y))
 			pyautogui.click(x, y)
 	else:
 		logger.info('Please enter desktop or apps as the resource type.')
 		raise Exception("Please enter desktop or apps as the resource type.")
 		
 	logger.info('Change to Destops or favorites success, start sleep...')
-	time.sleep(5)
+	settle.wait(5, 'launch')
 	logger.info('Change to Destops or favorites success, sleep end.')
 	
+	profiling.mark('launch_app')
 	# launch the app_name
 	logger.info('type app name is [%s].' % (app_name))
 	pyautogui.typewrite(app_name, interval=0.5)
@@ -193,15 +284,20 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 		time.sleep(0.1)
 	logger.info('press enter.')
 	pyautogui.press('enter')
-	time.sleep(10)
+	# waits for the launch, the screen is still static right after enter
+	settle.wait(10, 'launch', need_change=True)
 	
 	logger.info("")
 	
+	profiling.mark('close_receiver')
 	if testType != 3:
 		#print "set receiver to foreground"
 		logger.info('set receiver to foreground.')
 		#win.set_foreground()
 		time.sleep(2)
+		# the settled screen may only be the StoreFront overlay or the download bar, closing IE before
+		# the ica file reached the client cancels the launch
+		wait_ica_handoff(VDA_name)
 		win = pyautogui.getWindow('Citrix Receiver')
 		if win != None:
 			logger.info('getWindow Citrix Receiver success.')
@@ -213,10 +309,11 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 	else:
 		logger.info('Do not close IE, because of need testing reconnect.')
 		
-	time.sleep(proc_wait_time)
+	failfast.wait(proc_wait_time, 'session')
 	
 	logger.info("")
 	
+	profiling.mark('session_pin')
 	ret = 2000
 	win = None
 	for i in range(0, 10):
@@ -226,7 +323,7 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 			#print "can not find desktop session"
 			logger.info('can not find [%s] session.' % (VDA_name))
 			ret += 1
-			time.sleep(1)
+			failfast.wait(1, 'session')
 			continue
 		elif win != None:
 			#print "find desktop session"
@@ -234,7 +331,7 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 			
 			win.set_foreground()
 			
-			time.sleep(5)
+			settle.wait(5, 'session', window_region(win))
 			
 			logger.info('set foucus desktop session finished.')
 			
@@ -294,7 +391,7 @@ def launch_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 	
 	
 
-def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
+def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd, display=None):
 
 	global citrix_receiver_desktops_x, citrix_receiver_desktops_y
 	global vda_pin_center_x, vda_pin_center_y
@@ -324,7 +421,28 @@ def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 	status = 0
 	
 	logger.info('Resource type is [%s] and app_name is [%s].' % (resourcetype, app_name))  
+	bind_display(display)
 	logger.info('##### reconnect start ...')  
+	profiling.mark('reconnect')
+	
+	if store_url != "":
+		ica_path = sessionapi.resume(store_url, store_domain, user_name, store_password, app_name)
+		if ica_path:
+			try:
+				# the Desktop Viewer opens before its PIN prompt, wait until the prompt is shown in it
+				end = time.time() + proc_wait_time
+				while time.time() < end:
+					win = pyautogui.getWindow(VDA_name)
+					if win != None and pinwatcher.locate_in_window(win, 'pin.png', 0.3) != None:
+						return reconnect_session_pin(VDA_name, PIN_passwd)
+					# not the session step, a 'Cannot start destop' dialog here is left to the Receiver UI reconnect
+					failfast.wait(1, 'resume')
+				logger.info('resumed session [%s] showed no PIN prompt in [%d] seconds.' % (VDA_name, proc_wait_time))
+			finally:
+				# wfica has read the ica file by now, or the resume is abandoned
+				sessionapi.remove_ica(ica_path)
+		logger.info('resume by store api failed, reconnect by Receiver UI.')
+		logger.info("")
 	
 	win = None
 	win = pyautogui.getWindow('Citrix Receiver')
@@ -346,8 +464,8 @@ def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 	
 	if resourcetype == 'desktop':
 		logger.info('start screen search...')
-		loc = pyautogui.locateOnScreen('desktops.png')
-		logger.info('screen search result is [%s]' % (loc))
+		loc = pyautogui.locateOnScreen(get_template('desktops.png'))
+		logger.info('screen search result is [%s]' % (str(loc)))
 		if loc == None:
 			#print "Can not find icon for desktops."
 			logger.info('Can not find icon for desktops.')
@@ -361,12 +479,12 @@ def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 		else:
 			x, y = pyautogui.center(loc)
 			#print x, y
-			logger.info('desktops x and y is [%d - %d].' %(x, Y))
+			logger.info('desktops x and y is [%d - %d].' %(x, y))
 			#print "click desktop"
 			logger.info('click desktop.')
 			pyautogui.click(x, y)
 	elif resourcetype == 'apps':
-		loc = pyautogui.locateOnScreen('apps.png')
+		loc = pyautogui.locateOnScreen(get_template('apps.png'))
 		if loc == None:
 			#print "Cannot find icon for apps."
 			logger.info('Cannot find icon for apps.')
@@ -375,18 +493,19 @@ def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 		else:
 			x, y = pyautogui.center(loc)
 			#print x,y
-			logger.info('apps x and y is [%d - %d].' %(x, Y))
+			logger.info('apps x and y is [%d - %d].' %(x, y))
 			pyautogui.click(x, y)
 	else:
 		logger.info('Please enter desktop or apps as the resource type.')
 		raise Exception("Please enter desktop or apps as the resource type.")
 		
 	logger.info('Change to Destops or favorites success, start sleep...')
-	time.sleep(5)
+	settle.wait(5, 'reconnect')
 	logger.info('Change to Destops or favorites success, sleep end.')
 	
 	logger.info("")
 	
+	profiling.mark('launch_app')
 	# launch the app_name
 	logger.info('type app_name is [%s].' % (app_name))
 	pyautogui.typewrite(app_name, interval=0.5)
@@ -398,10 +517,12 @@ def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 	#print "press enter"
 	logger.info('press enter.')
 	pyautogui.press('enter')
-	time.sleep(10)
+	# waits for the launch, the screen is still static right after enter
+	settle.wait(10, 'reconnect', need_change=True)
 	
 	logger.info("")
 	
+	profiling.mark('wait_session')
 	win1 = None
 	for i in range(0, 20):
 		#win = pyautogui.getWindow('rh73demo - Desktop Viewer')
@@ -429,7 +550,7 @@ def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 				pyautogui.press('tab')
 				time.sleep(0.2)
 			pyautogui.press('enter')
-			time.sleep(5)
+			settle.wait(5, 'reconnect', need_change=True)
 			continue
 		elif win1 != None:
 			break
@@ -442,6 +563,7 @@ def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 	
 	logger.info("")
 	
+	profiling.mark('close_receiver')
 	#print "set receiver to foreground"
 	logger.info('set receiver to foreground.')
 	win.set_foreground()
@@ -455,10 +577,22 @@ def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 		pyautogui.press('f4')
 		pyautogui.keyUp('alt')
 
-	time.sleep(proc_wait_time)
+	failfast.wait(proc_wait_time, 'session')
 	
 	logger.info("")
 	
+	return reconnect_session_pin(VDA_name, PIN_passwd)
+	
+	
+	
+
+def reconnect_session_pin(VDA_name, PIN_passwd):
+
+	global vda_pin_center_x, vda_pin_center_y
+	global vda_pin_passwd_x, vda_pin_passwd_y
+	global vda_pin_ok_button_x, vda_pin_ok_button_y
+	
+	profiling.mark('session_pin')
 	ret = 2000
 	win = None
 	for i in range(0, 10):
@@ -468,7 +602,7 @@ def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 			#print "can not find desktop session"
 			logger.info('can not find [%s] session.' % (VDA_name))
 			ret += 1
-			time.sleep(1)
+			failfast.wait(1, 'session')
 			continue
 		elif win != None:
 			#print "find desktop session"
@@ -476,7 +610,7 @@ def reconnect_session(resourcetype, app_name, ddc_url, VDA_name, PIN_passwd):
 			
 			win.set_foreground()
 			
-			time.sleep(5)
+			settle.wait(5, 'session', window_region(win))
 			
 			logger.info('set foucus desktop session finished.')
 			
@@ -552,21 +686,48 @@ if __name__ == "__main__":
 	PIN_passwd       = cf.get("setting", "PIN_passwd")
 	Incorrect_passwd = cf.get("setting", "Incorrect_passwd")
 	
-	citrix_receiver_desktops_x = cf.getint("cood", "citrix_receiver_desktops_x")
-	citrix_receiver_desktops_y = cf.getint("cood", "citrix_receiver_desktops_y")
-	vda_pin_center_x           = cf.getint("cood", "vda_pin_center_x")
-	vda_pin_center_y           = cf.getint("cood", "vda_pin_center_y")
-	vda_pin_passwd_x           = cf.getint("cood", "vda_pin_passwd_x")
-	vda_pin_passwd_y           = cf.getint("cood", "vda_pin_passwd_y")
-	vda_pin_ok_button_x        = cf.getint("cood", "vda_pin_ok_button_x")
-	vda_pin_ok_button_y        = cf.getint("cood", "vda_pin_ok_button_y")
+	# profile written by calibrate.py for this screen size, otherwise [cood]
+	w,d = pyautogui.size()
+	cood_section = 'cood_%dx%d' % (w, d)
+	if not cf.has_section(cood_section):
+		cood_section = "cood"
+	
+	citrix_receiver_desktops_x = cf.getint(cood_section, "citrix_receiver_desktops_x")
+	citrix_receiver_desktops_y = cf.getint(cood_section, "citrix_receiver_desktops_y")
+	vda_pin_center_x           = cf.getint(cood_section, "vda_pin_center_x")
+	vda_pin_center_y           = cf.getint(cood_section, "vda_pin_center_y")
+	vda_pin_passwd_x           = cf.getint(cood_section, "vda_pin_passwd_x")
+	vda_pin_passwd_y           = cf.getint(cood_section, "vda_pin_passwd_y")
+	vda_pin_ok_button_x        = cf.getint(cood_section, "vda_pin_ok_button_x")
+	vda_pin_ok_button_y        = cf.getint(cood_section, "vda_pin_ok_button_y")
 	
 	proc_wait_time = cf.getint("times", "proc_wait_time")
 	opt_wait_time  = cf.getint("times", "opt_wait_time")
 	
+	if cf.has_option("times", "pin_grace_time"):
+		pin_grace_time = cf.getint("times", "pin_grace_time")
+	
+	if cf.has_option("times", "settle_time"):
+		settle.stable_time = cf.getfloat("times", "settle_time")
+	
 	work_path   = cf.get("default", "work_path")
 	ps_logfile  = cf.get("default", "ps_logfile")
 	py_logfile  = cf.get("default", "py_logfile")
+	
+	if cf.has_option("default", "run_mode"):
+		run_mode = cf.get("default", "run_mode")
+	
+	if cf.has_option("default", "record_file"):
+		record_file = cf.get("default", "record_file")
+	
+	if cf.has_option("default", "profile"):
+		profile = cf.getint("default", "profile")
+	
+	# Store service for the api reconnect, empty store_url keeps the Receiver UI reconnect
+	if cf.has_section("store"):
+		store_url      = cf.get("store", "store_url")
+		store_domain   = cf.get("store", "domain")
+		store_password = cf.get("store", "password")
 
 	
 	#if os.path.exists(py_logfile):
@@ -595,8 +756,10 @@ if __name__ == "__main__":
 	logger.info('ddc_url          : %s' % (ddc_url))
 	logger.info('PIN_passwd       : %s' % (PIN_passwd))
 	logger.info('Incorrect_passwd : %s' % (Incorrect_passwd))
+	logger.info('store_url        : %s' % (store_url))
 	logger.info("")
 	
+	logger.info('cood section                : %s' % (cood_section))
 	logger.info('citrix_receiver_desktops_x  : %d' % (citrix_receiver_desktops_x))
 	logger.info('citrix_receiver_desktops_y  : %d' % (citrix_receiver_desktops_y))
 	logger.info('vda_pin_center_x            : %d' % (vda_pin_center_x))
@@ -609,11 +772,16 @@ if __name__ == "__main__":
 	
 	logger.info('proc_wait_time : %d' % (proc_wait_time))
 	logger.info('opt_wait_time  : %d' % (opt_wait_time))
+	logger.info('pin_grace_time : %d' % (pin_grace_time))
+	logger.info('settle_time    : %.1f' % (settle.stable_time))
 	logger.info("")
 	
 	logger.info('work_path   : %s' % (work_path))
 	logger.info('ps_logfile  : %s' % (ps_logfile))
 	logger.info('py_logfile  : %s' % (py_logfile))
+	logger.info('run_mode    : %s' % (run_mode))
+	logger.info('record_file : %s' % (record_file))
+	logger.info('profile     : %d' % (profile))
 	logger.info("********************************************************************************************")
 	logger.info("")
 	
@@ -631,11 +799,46 @@ if __name__ == "__main__":
 	
 	os.chdir(work_path)
 	
+	# screen and input of the windows session this worker runs in
+	display = robot.session_display()
 	
 	w,d = pyautogui.size()
 	logger.info('this client screen width and height is [%d - %d].' % (w, d))
 	logger.info("")
 	
+	if record_file != "":
+		# everything replay needs to call the flow again without the configuration file
+		meta = {
+			'resourcetype' : resourcetype,
+			'app_name'     : app_name,
+			'ddc_url'      : ddc_url,
+			'VDA_name'     : VDA_name,
+			'PIN_passwd'   : (testType == 2) and Incorrect_passwd or PIN_passwd,
+			'testType'     : testType,
+			'testExt'      : testExt,
+			'screen'       : [w, d],
+			'session'      : display.session,
+			'settle_time'  : settle.stable_time,
+			'globals'      : {
+				'citrix_receiver_desktops_x' : citrix_receiver_desktops_x,
+				'citrix_receiver_desktops_y' : citrix_receiver_desktops_y,
+				'vda_pin_center_x'           : vda_pin_center_x,
+				'vda_pin_center_y'           : vda_pin_center_y,
+				'vda_pin_passwd_x'           : vda_pin_passwd_x,
+				'vda_pin_passwd_y'           : vda_pin_passwd_y,
+				'vda_pin_ok_button_x'        : vda_pin_ok_button_x,
+				'vda_pin_ok_button_y'        : vda_pin_ok_button_y,
+				'proc_wait_time'             : proc_wait_time,
+				'opt_wait_time'              : opt_wait_time,
+				'pin_grace_time'             : pin_grace_time,
+				'testType'                   : testType,
+			},
+		}
+		display.gui   = recorder.Recorder(display.gui, record_file, meta)
+		display.shell = recorder.RecordedShell(display.gui, display.shell)
+		logger.info('record this run into [%s].' % (record_file))
+		logger.info("")
+	
 	logger.info('work path is [%s].' % (os.getcwd()))
 	logger.info('abs path is [%s].' % (os.path.abspath(os.path.dirname(__file__))))
 	logger.info("")
@@ -646,53 +849,77 @@ if __name__ == "__main__":
 	else:
 		logger.info('desktops is not exist')
 	
-	if ( (resourcetype == "") or (app_name == "") or (ddc_url == "") or (VDA_name == "") or (PIN_passwd == "")):
-		logger.info('Input desktop name or PIN password is not correct.')
-		raise Exception("Input desktop name or PIN password is not correct.")
-		#sys.exit()
+	robot.bind(display)
+	
+	# an exception ends the run too, the record gets the exit code record_error
+	try:
+		if ( (resourcetype == "") or (app_name == "") or (ddc_url == "") or (VDA_name == "") or (PIN_passwd == "")):
+			logger.info('Input desktop name or PIN password is not correct.')
+			raise Exception("Input desktop name or PIN password is not correct.")
+			#sys.exit()
 	
 	
-	if ((testType == 3) and (testExt > 0)):
-		reRes = reconnect_session(resourcetype,app_name, ddc_url, VDA_name, PIN_passwd)
-		logger.info('call reconnect_session result is [%d].' % (reRes))
-		if (reRes == 0):
-			logger.info('Reconnect is success...')
+		if (profile == 1):
+			profile_name = '%s_profile_%s' % (os.path.splitext(logfile)[0], time.strftime('%Y%m%d_%H%M%S'))
+			profiling.start(profile_name)
+			logger.info('profile this run into [%s].' % (profile_name))
 			logger.info("")
-		os._exit(reRes)
+	
+		if ((testType == 3) and (testExt > 0)):
+			reRes = run_flow(reconnect_session, resourcetype,app_name, ddc_url, VDA_name, PIN_passwd, display)
+			logger.info('call reconnect_session result is [%d].' % (reRes))
+			if (reRes == 0):
+				logger.info('Reconnect is success...')
+				logger.info("")
+			exit_robot(reRes)
 		
 	
-	#while( res != 0 and res != 1 ):
-	while( res != 0 ):
+		#while( res != 0 and res != 1 ):
+		while( res != 0 ):
 		
-		logger.info("")
+			logger.info("")
 		
-		try:
-			subprocess.check_output('powershell "get-process iexplore -ErrorAction silentlycontinue | select-object Id | foreach-object { taskkill /t /f /pid $_.Id}"', shell=True)
-		except:
-			#print "no iexplore"
-			logger.info('no iexplore [%d].' % (res))
+			start_time = time.time()
 		
-		if (testType == 2):
-			res = launch_session(resourcetype,app_name, ddc_url, VDA_name, Incorrect_passwd)
-		else:
-			res = launch_session(resourcetype,app_name, ddc_url, VDA_name, PIN_passwd)
-		#print res
-		logger.info('call launch_session result is [%d].' % (res))
+			if (run_mode == "async"):
+				# cleanup, preload and warm up run together, IE must only wait for the cleanup
+				phases = prepare.start_phases(ddc_url, template_names)
+				template_phase = phases['preload']
+				phases['cleanup'].wait()
+			else:
+				phases = {'cleanup' : prepare.run_phase('cleanup', prepare.kill_iexplore)}
 		
-		if (res == 1001):
-			logger.info('PIN password is not correct and end autotest.')
-			logger.info("")
+			launch_start = time.time()
+			if (testType == 2):
+				res = run_flow(launch_session, resourcetype,app_name, ddc_url, VDA_name, Incorrect_passwd, display)
+			else:
+				res = run_flow(launch_session, resourcetype,app_name, ddc_url, VDA_name, PIN_passwd, display)
+			launch_time = time.time() - launch_start
+			#print res
+			logger.info('call launch_session result is [%d].' % (res))
+		
+			phase_times = [('launch', launch_time)]
+			for name in sorted(phases.keys()):
+				phases[name].wait(opt_wait_time)
+				phase_times.append((name, phases[name].elapsed))
+			prepare.report(phase_times, time.time() - start_time)
+		
+			if (res == 1001):
+				logger.info('PIN password is not correct and end autotest.')
+				logger.info("")
 			
-			os._exit(res)
-		elif (res == 0):
-			#time.sleep(30)
-			#os.system("taskkill /F /IM CDViewer.exe")
-			logger.info('Log on and open LinuxVDA success, return.')
-			logger.info("")
+				exit_robot(res)
+			elif (res == 0):
+				#time.sleep(30)
+				#os.system("taskkill /F /IM CDViewer.exe")
+				logger.info('Log on and open LinuxVDA success, return.')
+				logger.info("")
 			
-			os._exit(res)
-		break
+				exit_robot(res)
+			break
 	
-	logger.info("")
+		logger.info("")
 	
-	os._exit(res)
+		exit_robot(res)
+	finally:
+		close_record(record_error)
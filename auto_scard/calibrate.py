@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# ! -*- coding: utf-8 -*-
+# @Time    :2018/03/12 10:20
+# @File    :calibrate.py
+
+"""
+Offline batch calibration of the [cood] section.
+
+Instead of running mouse.exe on every robot and clicking each control by hand,
+put reference screenshots of the robot screens into one folder and run:
+
+	python calibrate.py <screenshot_dir> <output_dir> [scard_auto.conf]
+
+Screenshot file names carry the resolution and the windows display scale (percent),
+for example "1920x1080_100.png" or "1366x768_125.png". One screenshot can show the
+StoreFront page, another the PIN dialog of the same resolution: "1920x1080_100_pin.png".
+All screenshots with the same "<width>x<height>_<scale>" prefix are merged into one profile.
+
+Templates captured at a display scale are used when they exist next to the template, for example
+"desktops_125.png". Otherwise the template is resampled to the scale, which only matches with
+opencv (cv2) installed, because pyautogui matches pixel exact without it.
+
+For every profile a "<width>x<height>_<scale>.conf" file with a complete [cood] section
+is written to <output_dir>. If a configuration file is given, the profiles are also
+written into it as [cood_<width>x<height>] sections, LaunchSession.py uses the section
+matching the current screen size before falling back to [cood]. Several scales of one resolution
+can not share that section, so they are reported as an error and not merged.
+"""
+
+import os
+import sys
+import re
+import time
+import ConfigParser
+import multiprocessing
+
+# pyscreeze does the matching of pyautogui, but imports without a display, so this runs on Linux too
+import pyscreeze
+
+from PIL import Image
+
+from recorder import template_path
+
+use_opencv = pyscreeze.useOpenCV
+
+
+# template image, [cood] key prefix, x offset inside the template (0.5 is the center)
+cood_templates = [
+	('desktops.png', 'citrix_receiver_desktops', 0.5),
+	('pin.png',      'vda_pin_center',           0.5),
+	('pin.png',      'vda_pin_passwd',           0.64),
+	('confirm.png',  'vda_pin_ok_button',        0.5),
+]
+
+# candidate scales tried when the file name does not give one
+default_scales = [100, 125, 150, 175, 200]
+
+# a resampled template never matches pixel exact, opencv matching needs a lower confidence
+scaled_confidence = 0.9
+
+shot_name_re = re.compile(r'^(\d+)x(\d+)(?:_(\d+))?')
+
+
+def parse_shot_name(filename):
+	m = shot_name_re.match(os.path.basename(filename))
+	if m == None:
+		return None
+
+	w = int(m.group(1))
+	h = int(m.group(2))
+	if m.group(3) == None:
+		scale = 0
+	else:
+		scale = int(m.group(3))
+
+	return (w, h, scale)
+
+
+def scale_template(template, scale):
+	if scale == 100:
+		return template
+
+	w, h = template.size
+	size = (int(round(w * scale / 100.0)), int(round(h * scale / 100.0)))
+	return template.resize(size, Image.ANTIALIAS)
+
+
+def open_template(path):
+	# the templates of the tree are desktops.PNG, pin.PNG ..., find them on case sensitive file systems too
+	path = template_path(path)
+	if not os.path.exists(path):
+		return None
+	return Image.open(path).convert('RGB')
+
+
+def captured_template(template_dir, template_name, scale):
+	# template captured on a screen with this scale, e.g. desktops_125.png, None when there is none
+	if scale == 100:
+		return open_template(os.path.join(template_dir, template_name))
+	base, ext = os.path.splitext(template_name)
+	return open_template(os.path.join(template_dir, '%s_%d%s' % (base, scale, ext)))
+
+
+def locate_template(template_dir, template_name, screen, scales):
+	# grayscale matching goes through opencv matchTemplate when cv2 is installed
+	template = None
+	for scale in scales:
+		needle = captured_template(template_dir, template_name, scale)
+		if needle != None:
+			loc = pyscreeze.locate(needle, screen, grayscale=True)
+		elif use_opencv:
+			if template == None:
+				template = open_template(os.path.join(template_dir, template_name))
+			if template == None:
+				break
+			needle = scale_template(template, scale)
+			loc = pyscreeze.locate(needle, screen, grayscale=True, confidence=scaled_confidence)
+		else:
+			# resampled templates can not match without opencv
+			continue
+
+		if loc != None:
+			return (loc, scale)
+
+	return (None, 0)
+
+
+def calibrate_shot(args):
+	# worker of the process pool, must stay a module level function
+	shot_path, template_dir = args
+
+	w, h, scale = parse_shot_name(shot_path)
+	if scale == 0:
+		scales = default_scales
+	else:
+		scales = [scale]
+
+	screen = Image.open(shot_path).convert('RGB')
+
+	found = {}
+	for (template_name, key, x_offset) in cood_templates:
+		loc, used_scale = locate_template(template_dir, template_name, screen, scales)
+		if loc == None:
+			continue
+
+		left, top, width, height = loc
+		found[key] = (int(left + width * x_offset), int(top + height / 2))
+
+	return (shot_path, found)
+
+
+def profile_name(shot_path):
+	w, h, scale = parse_shot_name(shot_path)
+	if scale == 0:
+		return '%dx%d' % (w, h)
+	return '%dx%d_%d' % (w, h, scale)
+
+
+def write_profile(cf, section, cood):
+	if not cf.has_section(section):
+		cf.add_section(section)
+
+	for (template_name, key, x_offset) in cood_templates:
+		x, y = cood[key]
+		cf.set(section, key + '_x', str(x))
+		cf.set(section, key + '_y', str(y))
+
+
+def calibrate(shot_dir, out_dir, conf_file=None, template_dir=None):
+
+	if template_dir == None:
+		template_dir = os.path.abspath(os.path.dirname(__file__))
+
+	shots = []
+	for filename in sorted(os.listdir(shot_dir)):
+		if not filename.lower().endswith('.png'):
+			continue
+		if parse_shot_name(filename) == None:
+			print "skip [%s], name is not <width>x<height>[_<scale>].png." % (filename)
+			continue
+		shots.append(os.path.join(shot_dir, filename))
+
+	if len(shots) == 0:
+		print "no screenshot found in [%s]." % (shot_dir)
+		return 1
+
+	start = time.time()
+
+	pool = multiprocessing.Pool()
+	try:
+		results = pool.map(calibrate_shot, [(shot, template_dir) for shot in shots])
+	finally:
+		pool.close()
+		pool.join()
+
+	# merge all screenshots of the same resolution into one profile
+	profiles = {}
+	for (shot_path, found) in results:
+		name = profile_name(shot_path)
+		profiles.setdefault(name, {}).update(found)
+
+	if not os.path.exists(out_dir):
+		os.makedirs(out_dir)
+
+	if conf_file != None:
+		conf = ConfigParser.ConfigParser()
+		conf.read(conf_file)
+
+		# [cood_<width>x<height>] has no scale, only one profile of a resolution can go there
+		sections = {}
+		for name in profiles.keys():
+			sections.setdefault('cood_' + name.split('_')[0], []).append(name)
+
+	status = 0
+	for name in sorted(profiles.keys()):
+		cood = profiles[name]
+		missing = [key for (template_name, key, x_offset) in cood_templates if key not in cood]
+		if len(missing) > 0:
+			print "profile [%s] is not complete, can not find [%s]." % (name, ', '.join(missing))
+			status = 2
+			continue
+
+		cf = ConfigParser.ConfigParser()
+		write_profile(cf, 'cood', cood)
+		out_file = os.path.join(out_dir, name + '.conf')
+		fp = open(out_file, 'w')
+		try:
+			cf.write(fp)
+		finally:
+			fp.close()
+
+		print "profile [%s] is written to [%s]." % (name, out_file)
+
+		if conf_file != None:
+			section = 'cood_' + name.split('_')[0]
+			if len(sections[section]) > 1:
+				print "profile [%s] is not merged, [%s] has profiles [%s]." % (name, section, ', '.join(sorted(sections[section])))
+				status = 3
+				continue
+			write_profile(conf, section, cood)
+
+	if conf_file != None:
+		fp = open(conf_file, 'w')
+		try:
+			conf.write(fp)
+		finally:
+			fp.close()
+		print "profiles are merged into [%s]." % (conf_file)
+
+	print "calibrate [%d] screenshots into [%d] profiles in [%.2f] seconds." % (len(shots), len(profiles), time.time() - start)
+
+	return status
+
+
+if __name__ == "__main__":
+
+	if len(sys.argv) < 3:
+		print "usage: python calibrate.py <screenshot_dir> <output_dir> [scard_auto.conf]"
+		sys.exit(1)
+
+	shot_dir = sys.argv[1]
+	out_dir  = sys.argv[2]
+	conf_file = None
+	if len(sys.argv) > 3:
+		conf_file = sys.argv[3]
+
+	sys.exit(calibrate(shot_dir, out_dir, conf_file))
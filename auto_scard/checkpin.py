@@ -11,59 +11,55 @@ import time
 import subprocess
 import argparse
 
+import pinwatcher
+
 
 """
-This script is used to launch Session with Chrome Reciever. 
+This script is used to input the PIN password of smart card in the opened LinuxVDA desktops.
 
-Please provide login username, password, resource type(can be "desktop" or "apps"), resource name and the Chrome App id as the parameters. Then it will launch the ICA session for you.
+Please provide the desktop name(s) and the PIN password as the parameters, -d can be given several times.
+All desktops are watched at the same time and the PIN prompts are answered in the order they appear.
 """
 
 def cmd_parse(desktopName, pinCode) :
-    parser = argparse.ArgumentParser()
-    parser.add_argument('-d', action='store', dest='desktopName',  default= desktopName,  help='LinuxVDA desktop name')
-    parser.add_argument('-p', action='store', dest='pinCode',      default= pinCode,      help='PIN password of smart card')
-    
-    results = parser.parse_args()
-    desktopName = results.desktopName
-    pinCode     = results.pinCode
-    
-    dict = {'key-desktopname': desktopName, 'key-pincode': pinCode}
-
-    return dict
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-d', action='append', dest='desktopName',  default= desktopName,  help='LinuxVDA desktop name, can be given several times')
+	parser.add_argument('-p', action='store',  dest='pinCode',      default= pinCode,      help='PIN password of smart card')
+	parser.add_argument('-t', action='store',  dest='timeout',      default= 60, type=int, help='seconds to wait for every desktop, and for its PIN prompt after it appears')
+
+	results = parser.parse_args()
+	desktopName = results.desktopName
+	pinCode     = results.pinCode
+
+	dict = {'key-desktopname': desktopName, 'key-pincode': pinCode, 'key-timeout': results.timeout}
+
+	return dict
 
 def checkpin():
-	desktopName = ""
+	desktopName = []
 	pinCode     = ""
-	
+
 	dict = cmd_parse(desktopName, pinCode)
-	
+
 	desktopName = dict['key-desktopname']
-    pinCode     = dict['key-pincode']
-	
-	if ( (desktopName == "") or (pinCode == "")):
-	    raise Exception("Input desktop name or PIN password is not correct.")
-		return -1
-	
-	print "Desktop name is [%s] and PIN password is [%s]." % (desktopName, pinCode)
-	
+	pinCode     = dict['key-pincode']
+	timeout     = dict['key-timeout']
+
+	if ( (len(desktopName) == 0) or (pinCode == "")):
+		raise Exception("Input desktop name or PIN password is not correct.")
+
+	print "Desktop name is [%s] and PIN password is [%s]." % (', '.join(desktopName), pinCode)
+
 	#win = pyautogui.getWindow('rh73demo - Desktop Viewer')
-	win = pyautogui.getWindow(desktopName)
-	win.set_foreground()
-	time.sleep(2)
-	loc = pyautogui.locateOnScreen('pin.png')
-	if loc == None:
-		raise Exception("Cannot find icon for pin.")
-	else:
-		x, y = pyautogui.center(loc)
-		pyautogui.click(x, y)
-		time.sleep(2)
-		#pyautogui.typewrite('000000')
-		pyautogui.typewrite(pinCode)
-		time.sleep(0.1)
-		pyautogui.press('tab')
-		time.sleep(0.1)
-		pyautogui.press('enter')
-	return 0
+	results = pinwatcher.PinWatcher(desktopName, pinCode, timeout).run()
+
+	ret = 0
+	for name in desktopName:
+		print "[%s] result is [%d]." % (name, results[name])
+		if results[name] != pinwatcher.PIN_OK:
+			ret = results[name]
+
+	return ret
 
 if __name__ == "__main__":
-	checkpin()
+	sys.exit(checkpin())
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# ! -*- coding: utf-8 -*-
+# @Time    :2018/05/14 10:20
+# @File    :displays.py
+
+"""
+Run scenarios in parallel on one robot host, every worker in its own windows session.
+
+pyautogui drives the desktop, pointer and keyboard of the session its process runs in, and every
+windows logon session has its own. So a worker is a robot user with an RDP session on this host, and
+its scenario is a LaunchSession.py process started inside that session by a scheduled task that runs
+only interactively (/IT). robot.Display is the handle of that session inside the process, failfast.py
+and prepare.py only watch and kill the iexplore of their own session.
+
+	python displays.py run   <conf> <resourcetype> <testType> <testExt> [runs]
+	python displays.py bench <conf> <resourcetype> <testType> <testExt> [runs]
+
+run spreads runs scenarios (default one per worker) over all workers and prints the code of every run.
+bench runs runs scenarios per worker with 1, 2 ... N workers and prints the throughput of every count
+and its scaling against one worker.
+
+[displays] of <conf> lists the workers, every worker reads its own <conf>_<user>.conf (smart card,
+PIN, VDA, work_path and log files of its user):
+	users    = robot1, robot2
+	password = password of the robot users
+	rdp_host = 127.0.0.2
+A worker without an active session is logged on by mstsc to rdp_host. The mstsc windows must stay open
+and not minimized, a minimized RDP window does not draw its desktop.
+"""
+
+import os
+import sys
+import time
+import ctypes
+import logging
+import threading
+import subprocess
+import ConfigParser
+import Queue
+
+
+logger = logging.getLogger('test')
+
+here = os.path.abspath(os.path.dirname(__file__))
+
+# seconds a worker session may take to log on, and a scenario to finish
+logon_timeout = 120
+run_timeout   = 600
+
+WTS_CURRENT_SERVER_HANDLE = None
+WTS_ACTIVE                = 0
+WTS_USER_NAME             = 5
+
+task_cmd = '''@echo off
+cd /d "%s"
+"%s" LaunchSession.py "%s" %s %d %d
+echo %%errorlevel%% > "%s.tmp"
+move /y "%s.tmp" "%s" > nul
+'''
+
+
+class WTS_SESSION_INFO(ctypes.Structure):
+	_fields_ = [('SessionId', ctypes.c_ulong), ('pWinStationName', ctypes.c_wchar_p), ('State', ctypes.c_int)]
+
+
+def sessions():
+	# {user: (session id, active)} of the windows sessions of this host
+	wtsapi = ctypes.windll.wtsapi32
+	info  = ctypes.POINTER(WTS_SESSION_INFO)()
+	count = ctypes.c_ulong()
+	if not wtsapi.WTSEnumerateSessionsW(WTS_CURRENT_SERVER_HANDLE, 0, 1, ctypes.byref(info), ctypes.byref(count)):
+		raise ctypes.WinError()
+
+	result = {}
+	try:
+		for i in range(count.value):
+			sid  = info[i].SessionId
+			user = ctypes.c_wchar_p()
+			size = ctypes.c_ulong()
+			if not wtsapi.WTSQuerySessionInformationW(WTS_CURRENT_SERVER_HANDLE, sid, WTS_USER_NAME, ctypes.byref(user), ctypes.byref(size)):
+				continue
+			if user.value:
+				result[user.value.lower()] = (sid, info[i].State == WTS_ACTIVE)
+			wtsapi.WTSFreeMemory(user)
+	finally:
+		wtsapi.WTSFreeMemory(info)
+	return result
+
+
+class Worker(object):
+
+	def __init__(self, user, password, conf):
+		self.user     = user
+		self.password = password
+		self.conf     = conf
+		self.session  = None
+		self.task     = 'scard_auto_%s' % (user)
+		self.cmd_file = os.path.join(here, 'logs', 'display_%s.cmd' % (user))
+		self.result   = os.path.join(here, 'logs', 'display_%s.result' % (user))
+
+	def logon(self, rdp_host):
+		# the session must be active, a disconnected session has no desktop to draw on
+		state = sessions().get(self.user.lower())
+		if state != None and state[1]:
+			self.session = state[0]
+			return
+
+		logger.info('log on worker [%s] by RDP to [%s].' % (self.user, rdp_host))
+		subprocess.check_output('cmdkey /generic:TERMSRV/%s /user:%s /pass:%s' % (rdp_host, self.user, self.password), shell=True)
+		subprocess.Popen(['mstsc', '/v:%s' % (rdp_host)])
+		end = time.time() + logon_timeout
+		while time.time() < end:
+			state = sessions().get(self.user.lower())
+			if state != None and state[1]:
+				self.session = state[0]
+				# the logon ends after the session turns active
+				time.sleep(10)
+				return
+			time.sleep(2)
+		raise Exception('worker [%s] has no active session after [%d] seconds.' % (self.user, logon_timeout))
+
+	def run(self, resourcetype, testType, testExt):
+		# start LaunchSession.py in the session of the worker and wait for its exit code
+		if os.path.exists(self.result):
+			os.remove(self.result)
+		with open(self.cmd_file, 'w') as f:
+			f.write(task_cmd % (here, sys.executable, self.conf, resourcetype, testType, testExt,
+				self.result, self.result, self.result))
+
+		subprocess.check_output('schtasks /create /f /tn %s /tr "\\"%s\\"" /sc once /st 00:00 /ru %s /rp %s /it' % (
+			self.task, self.cmd_file, self.user, self.password), shell=True)
+		subprocess.check_output('schtasks /run /tn %s' % (self.task), shell=True)
+
+		end = time.time() + run_timeout
+		while time.time() < end:
+			if os.path.exists(self.result):
+				with open(self.result) as f:
+					return int(f.read().strip())
+			time.sleep(1)
+		logger.info('worker [%s] did not finish in [%d] seconds.' % (self.user, run_timeout))
+		return -1
+
+	def remove(self):
+		subprocess.call('schtasks /delete /f /tn %s' % (self.task), shell=True)
+
+
+def load_workers(conf):
+	cf = ConfigParser.ConfigParser()
+	cf.read(conf)
+	users    = [u.strip() for u in cf.get('displays', 'users').split(',') if u.strip()]
+	password = cf.get('displays', 'password')
+	rdp_host = cf.get('displays', 'rdp_host')
+
+	base, ext = os.path.splitext(os.path.abspath(conf))
+	workers = []
+	for user in users:
+		worker_conf = '%s_%s%s' % (base, user, ext)
+		if not os.path.exists(worker_conf):
+			raise Exception('worker [%s] has no configuration file [%s].' % (user, worker_conf))
+		workers.append(Worker(user, password, worker_conf))
+	return workers, rdp_host
+
+
+def run(workers, runs, resourcetype, testType, testExt):
+	# every worker takes the next run when its last one ended, give back (worker, code, seconds) of every run
+	todo = Queue.Queue()
+	for i in range(runs):
+		todo.put(i)
+	results = []
+	lock = threading.Lock()
+
+	def work(worker):
+		while True:
+			try:
+				todo.get_nowait()
+			except Queue.Empty:
+				return
+			start = time.time()
+			try:
+				code = worker.run(resourcetype, testType, testExt)
+			except Exception as e:
+				logger.info('worker [%s] failed due to [%s].' % (worker.user, e))
+				code = -1
+			with lock:
+				results.append((worker.user, code, time.time() - start))
+				print "[%s] session [%s] code [%d] in [%.1f] seconds." % (worker.user, worker.session, code, time.time() - start)
+
+	threads = [threading.Thread(target=work, args=(w,)) for w in workers]
+	for t in threads:
+		t.daemon = True
+		t.start()
+	for t in threads:
+		t.join()
+	return results
+
+
+def bench(workers, runs, resourcetype, testType, testExt):
+	# runs per worker with 1..N workers, throughput and scaling against one worker
+	rows = []
+	for n in range(1, len(workers) + 1):
+		start = time.time()
+		results = run(workers[:n], runs * n, resourcetype, testType, testExt)
+		wall = time.time() - start
+		ok = len([r for r in results if r[1] == 0])
+		rows.append((n, len(results), ok, wall, len(results) * 60.0 / wall))
+
+	print ""
+	print "workers   runs   ok   seconds   runs/min   scaling"
+	for n, count, ok, wall, rate in rows:
+		print "%7d %6d %4d %9.1f %10.2f %8.2f" % (n, count, ok, wall, rate, rate / rows[0][4])
+	return rows
+
+
+if __name__ == "__main__":
+
+	if len(sys.argv) < 6 or sys.argv[1] not in ('run', 'bench'):
+		print "usage: python displays.py run|bench <conf> <resourcetype> <testType> <testExt> [runs]"
+		sys.exit(1)
+
+	logging.basicConfig(level=logging.INFO)
+
+	mode, conf, resourcetype = sys.argv[1], sys.argv[2], sys.argv[3]
+	testType = int(sys.argv[4])
+	testExt  = int(sys.argv[5])
+
+	workers, rdp_host = load_workers(conf)
+	runs = len(sys.argv) > 6 and int(sys.argv[6]) or (mode == 'run' and len(workers) or 1)
+
+	for worker in workers:
+		worker.logon(rdp_host)
+
+	try:
+		if mode == 'run':
+			results = run(workers, runs, resourcetype, testType, testExt)
+			failed = len([r for r in results if r[1] != 0])
+			print "[%d] runs on [%d] workers, [%d] failed." % (len(results), len(workers), failed)
+			sys.exit(failed and 1 or 0)
+		bench(workers, runs, resourcetype, testType, testExt)
+	finally:
+		for worker in workers:
+			worker.remove()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# ! -*- coding: utf-8 -*-
+# @Time    :2018/04/09 13:30
+# @File    :failfast.py
+
+"""
+Known failure states of the launch/reconnect flow.
+
+Every wait of LaunchSession.py goes through wait(), which checks the signatures registered for the
+current step while it waits and raises FailFastError with the code of the first signature found.
+A signature is a window title (pyautogui.getWindow matches a part of the title), a template image on
+the screen or the exit of a process. The Windows Security dialog is still open after a correct PIN for a
+moment, so it is only a failure in the pin_check step, which starts after [times] pin_grace_time.
+The Receiver UI reconnect handles 'Cannot start destop' itself, so its step only checks StoreFront errors.
+The resume step (waiting for a session resumed by the store api) has no signatures, a failed resume falls
+back to the Receiver UI reconnect.
+Every subclass of Signature has check(), True when its failure state is there.
+Template signatures are only active when their image exists in the work directory.
+"""
+
+import os
+import logging
+
+import robot
+
+
+logger = logging.getLogger('test')
+
+# error codes returned by the flow
+ERR_PIN_INCORRECT   = 1001
+ERR_CANNOT_START    = 2101
+ERR_STOREFRONT      = 2102
+ERR_IEXPLORE_EXIT   = 2103
+
+
+class FailFastError(Exception):
+
+	def __init__(self, code, reason):
+		Exception.__init__(self, reason)
+		self.code = code
+
+
+class Signature(object):
+
+	# seconds between two checks, screen searches are expensive
+	interval = 1
+
+	def __init__(self, code, reason, steps):
+		self.code   = code
+		self.reason = reason
+		self.steps  = steps
+		self.last   = None
+
+	def due(self, now):
+		return self.last == None or now - self.last >= self.interval
+
+
+class WindowTitle(Signature):
+
+	def __init__(self, title, code, reason, steps):
+		Signature.__init__(self, code, reason, steps)
+		self.title = title
+
+	def check(self):
+		return robot.gui.getWindow(self.title) != None
+
+
+class Template(Signature):
+
+	interval = 3
+
+	def __init__(self, image, code, reason, steps):
+		Signature.__init__(self, code, reason, steps)
+		self.image = image
+
+	def check(self):
+		if not os.path.exists(self.image):
+			return False
+		return robot.gui.locateOnScreen(self.image) != None
+
+
+class ProcessExit(Signature):
+
+	def __init__(self, image_name, code, reason, steps):
+		Signature.__init__(self, code, reason, steps)
+		self.image_name = image_name
+		self.seen       = False
+
+	def check(self):
+		# only an exit after the process was seen is a failure
+		if process_running(self.image_name):
+			self.seen = True
+			return False
+		return self.seen
+
+
+def process_running(image_name):
+	try:
+		cmd = 'tasklist /FI "IMAGENAME eq %s" /NH' % (image_name)
+		if robot.display != None and robot.display.session != None:
+			# workers in other sessions run their own iexplore
+			cmd += ' /FI "SESSION eq %d"' % (robot.display.session)
+		o = robot.shell.check_output(cmd, shell=True)
+	except Exception:
+		return False
+	return image_name.lower() in o.lower()
+
+
+signatures = []
+
+
+def register(signature):
+	signatures.append(signature)
+	return signature
+
+
+def reset():
+	for sig in signatures:
+		sig.last = None
+		if isinstance(sig, ProcessExit):
+			sig.seen = False
+
+
+def check(step):
+	now = robot.clock.time()
+	for sig in signatures:
+		if step not in sig.steps or not sig.due(now):
+			continue
+		sig.last = now
+		if sig.check():
+			logger.info('fail fast in step [%s]: [%s], code is [%d].' % (step, sig.reason, sig.code))
+			raise FailFastError(sig.code, sig.reason)
+
+
+def wait(seconds, step, interval=0.5):
+	# sleep like time.sleep, but stop at once when a known failure shows up
+	end = robot.clock.time() + seconds
+	while True:
+		check(step)
+		left = end - robot.clock.time()
+		if left <= 0:
+			return
+		robot.clock.sleep(min(interval, left))
+
+
+register(ProcessExit('iexplore.exe',                ERR_IEXPLORE_EXIT, 'iexplore exited',                          ['logon', 'pin_check']))
+register(WindowTitle('Windows Security',            ERR_PIN_INCORRECT, 'Windows Security dialog open after the PIN', ['pin_check']))
+register(Template('pin_error.png',                  ERR_PIN_INCORRECT, 'PIN password is not correct',              ['logon', 'pin_check']))
+register(WindowTitle('Navigation Blocked',          ERR_STOREFRONT,    'StoreFront certificate error page',        ['logon', 'pin_check', 'launch', 'reconnect']))
+register(WindowTitle('be displayed',                ERR_STOREFRONT,    'StoreFront page can not be displayed',     ['logon', 'pin_check', 'launch', 'reconnect']))
+register(Template('sf_error.png',                   ERR_STOREFRONT,    'StoreFront shows an error',                ['logon', 'pin_check', 'launch', 'reconnect']))
+register(WindowTitle('Cannot start destop',         ERR_CANNOT_START,  'Cannot start desktop dialog',              ['launch', 'session']))
+register(WindowTitle('Cannot start desktop',        ERR_CANNOT_START,  'Cannot start desktop dialog',              ['launch', 'session']))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# ! -*- coding: utf-8 -*-
+# @Time    :2018/03/26 11:10
+# @File    :pinwatcher.py
+
+"""
+Watch several Desktop Viewer windows for the smart card PIN prompt at the same time.
+
+Every window gets its own watcher thread which looks for pin.png only inside the window region.
+The screen only shows the topmost of overlapping windows (Desktop Viewers are usually maximized
+to the same rect), so a watcher brings its window to the foreground before it searches, holding
+the screen lock shared by all watchers. Found prompts are put into one queue and served in
+arrival order by the calling thread, because the mouse and keyboard are shared by all windows.
+Before the PIN is typed the window is brought to the foreground and searched again under the lock.
+
+Every window has its own deadline: it must appear within timeout seconds, and its prompt must be
+served within timeout seconds after it appeared.
+"""
+
+import logging
+import threading
+import Queue
+
+import robot
+
+# the reconnect flow of LaunchSession.py uses locate_in_window too, so it goes through the switches
+pyautogui = robot.gui
+time      = robot.clock
+
+
+logger = logging.getLogger('test')
+
+# result of every window
+PIN_OK          = 0
+PIN_NO_WINDOW   = 4
+PIN_NO_PROMPT   = 5
+PIN_LATE        = 6
+
+
+def locate_in_window(win, template, focus_wait):
+	# the caller holds the screen lock, nothing else may change the foreground meanwhile
+	win.set_foreground()
+	time.sleep(focus_wait)
+	left, top, right, bottom = win.get_position()
+	return pyautogui.locateOnScreen(template, region=(left, top, right - left, bottom - top))
+
+
+class WindowWatcher(threading.Thread):
+
+	def __init__(self, name, template, timeout, prompts, lock, interval=0.5, focus_wait=0.3):
+		threading.Thread.__init__(self, name=name)
+		self.daemon     = True
+		self.template   = template
+		self.timeout    = timeout
+		self.prompts    = prompts
+		self.lock       = lock
+		self.interval   = interval
+		self.focus_wait = focus_wait
+		self.deadline   = time.time() + timeout
+		self.appeared   = False
+		self.done       = False
+		self.served     = threading.Event()
+		self.result     = PIN_NO_WINDOW
+
+	def run(self):
+		while not self.done and time.time() < self.deadline:
+			win = pyautogui.getWindow(self.name)
+			if win == None:
+				time.sleep(self.interval)
+				continue
+
+			if not self.appeared:
+				# the prompt deadline of this window starts when the window appears
+				self.appeared = True
+				self.deadline = time.time() + self.timeout
+				self.result   = PIN_NO_PROMPT
+
+			with self.lock:
+				loc = locate_in_window(win, self.template, self.focus_wait)
+			if loc == None:
+				time.sleep(self.interval)
+				continue
+
+			logger.info('PIN prompt of [%s] found at [%s].' % (self.name, loc))
+			self.served.clear()
+			self.prompts.put((time.time(), self, win))
+			# the serving thread either finishes this window or lets it watch again
+			self.served.wait()
+
+	def finish(self, result):
+		self.result = result
+		self.done   = True
+		self.served.set()
+
+
+class PinWatcher(object):
+
+	def __init__(self, names, pin_code, timeout=60, template='pin.png'):
+		self.names    = names
+		self.pin_code = pin_code
+		self.timeout  = timeout
+		self.template = template
+		self.lock     = threading.Lock()
+
+	def input_pin(self, loc):
+		x, y = pyautogui.center(loc)
+		pyautogui.click(x, y)
+		time.sleep(0.1)
+		pyautogui.typewrite(self.pin_code)
+		time.sleep(0.1)
+		pyautogui.press('tab')
+		time.sleep(0.1)
+		pyautogui.press('enter')
+
+	def run(self):
+		prompts = Queue.Queue()
+
+		watchers = {}
+		for name in self.names:
+			watchers[name] = WindowWatcher(name, self.template, self.timeout, prompts, self.lock)
+			watchers[name].start()
+
+		results = {}
+		while len(results) < len(watchers):
+			try:
+				found, watcher, win = prompts.get(timeout=0.5)
+			except Queue.Empty:
+				if not any([w.is_alive() for w in watchers.values()]) and prompts.empty():
+					break
+				continue
+
+			name = watcher.name
+			if time.time() > watcher.deadline:
+				logger.info('PIN prompt of [%s] is served too late.' % (name))
+				watcher.finish(PIN_LATE)
+				results[name] = PIN_LATE
+				continue
+
+			# another watcher may have changed the foreground since the prompt was found
+			with self.lock:
+				loc = locate_in_window(win, self.template, watcher.focus_wait)
+				if loc != None:
+					logger.info('input PIN of [%s], waited [%.2f] seconds in queue.' % (name, time.time() - found))
+					self.input_pin(loc)
+
+			if loc == None:
+				logger.info('PIN prompt of [%s] is gone, watch again.' % (name))
+				watcher.served.set()
+				continue
+
+			watcher.finish(PIN_OK)
+			results[name] = PIN_OK
+
+		for name in watchers:
+			if name not in results:
+				watchers[name].finish(watchers[name].result)
+				results[name] = watchers[name].result
+				logger.info('PIN of [%s] is not input, result is [%d].' % (name, results[name]))
+
+		return results
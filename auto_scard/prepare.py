@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# ! -*- coding: utf-8 -*-
+# @Time    :2018/03/15 14:05
+# @File    :prepare.py
+
+"""
+Preparation phases of LaunchSession.py which do not depend on each other.
+
+In async run mode ([default] run_mode = async) the cleanup of old iexplore, the template
+preloading and the StoreFront HTTP/TLS warm-up run in their own threads while IE is started,
+each step joins only the phase it needs. Python 2.7 has no asyncio, so plain threads are used.
+"""
+
+import os
+import time
+import ssl
+import socket
+import logging
+import subprocess
+import threading
+import urllib2
+
+from PIL import Image
+
+
+logger = logging.getLogger('test')
+
+# phases the sync path never runs
+async_only_phases = ['warmup']
+
+# only the iexplore of this session, workers in other sessions run their own (displays.py)
+kill_iexplore_cmd = 'powershell "get-process iexplore -ErrorAction silentlycontinue | where-object { $_.SessionId -eq (get-process -id $pid).SessionId } | select-object Id | foreach-object { taskkill /t /f /pid $_.Id}"'
+
+
+class Phase(threading.Thread):
+
+	def __init__(self, name, func, *args):
+		threading.Thread.__init__(self, name=name)
+		self.daemon  = True
+		self.func    = func
+		self.args    = args
+		self.result  = None
+		self.error   = None
+		self.elapsed = 0.0
+
+	def run(self):
+		start = time.time()
+		try:
+			self.result = self.func(*self.args)
+		except Exception as e:
+			self.error = e
+		self.elapsed = time.time() - start
+
+	def wait(self, timeout=None):
+		# join the phase and give back its result, None when it failed
+		self.join(timeout)
+		if self.is_alive():
+			logger.info('phase [%s] is still running after [%s] seconds.' % (self.name, timeout))
+			return None
+		if self.error != None:
+			logger.info('phase [%s] failed due to [%s].' % (self.name, self.error))
+			return None
+		return self.result
+
+
+def run_phase(name, func, *args):
+	# run a phase in the calling thread, used by the sequential path
+	phase = Phase(name, func, *args)
+	phase.run()
+	return phase
+
+
+def kill_iexplore():
+	try:
+		subprocess.check_output(kill_iexplore_cmd, shell=True)
+		return True
+	except Exception:
+		logger.info('no iexplore.')
+		return False
+
+
+def preload_templates(names):
+	templates = {}
+	for name in names:
+		if os.path.exists(name):
+			img = Image.open(name)
+			img.load()
+			templates[name] = img
+		else:
+			logger.info('template [%s] is not exist.' % (name))
+	return templates
+
+
+def warm_up_storefront(url, timeout=10):
+	# resolve DNS and do the TLS handshake, so IE finds warm caches on the DDC side
+	kwargs = {'timeout': timeout}
+	if hasattr(ssl, '_create_unverified_context'):
+		kwargs['context'] = ssl._create_unverified_context()
+
+	try:
+		resp = urllib2.urlopen(url, **kwargs)
+		code = resp.getcode()
+		resp.close()
+	except urllib2.HTTPError as e:
+		# smart card web store answers 401/403 without client certificate, server is warm anyway
+		code = e.code
+	except (urllib2.URLError, socket.error) as e:
+		logger.info('warm up [%s] failed due to [%s].' % (url, e))
+		return 0
+	return code
+
+
+def start_phases(ddc_url, template_names):
+	phases = {
+		'cleanup' : Phase('cleanup', kill_iexplore),
+		'preload' : Phase('preload', preload_templates, template_names),
+		'warmup'  : Phase('warmup',  warm_up_storefront, ddc_url),
+	}
+	for phase in phases.values():
+		phase.start()
+	return phases
+
+
+def report(phase_times, wall_time):
+	# sequential baseline is the sum of the phases the sync path runs too, async cost is the measured wall time.
+	# warmup only exists in async mode, counting it would inflate the speedup by the extra phase itself.
+	logger.info("")
+	logger.info("Phase report:")
+	logger.info("********************************************************************************************")
+	total = 0.0
+	for (name, elapsed) in phase_times:
+		if name in async_only_phases:
+			logger.info('phase %-8s : %.2f s (async only)' % (name, elapsed))
+			continue
+		logger.info('phase %-8s : %.2f s' % (name, elapsed))
+		total += elapsed
+	logger.info('sequential     : %.2f s' % (total))
+	logger.info('wall time      : %.2f s' % (wall_time))
+	if wall_time > 0:
+		logger.info('speedup        : %.2f' % (total / wall_time))
+	logger.info("********************************************************************************************")
+	logger.info("")
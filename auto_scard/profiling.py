@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# ! -*- coding: utf-8 -*-
+# @Time    :2018/04/23 15:50
+# @File    :profiling.py
+
+"""
+Sampling profiler for the launch/reconnect flow, enabled by [default] profile = 1.
+
+A background thread samples the stack of the flow thread every few milliseconds. LaunchSession.py
+marks the flow steps with mark(), so every sample belongs to one step. Sleeps of the flow clock
+(robot.clock) are counted as idle, and every failfast.wait() and settle.wait() call site gets its own
+wall/cpu numbers, so idle waits and busy waits (screen searches, window polling) can be told apart. When the run ends two files are written:
+	<name>.folded   collapsed stacks "step;frame;frame count", readable by flamegraph.pl / speedscope
+	<name>.txt      per step wall, cpu and idle time, per wait call site wall and cpu time
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+
+import robot
+import settle
+import failfast
+
+
+logger = logging.getLogger('test')
+
+profiler = None
+
+
+def cpu_time():
+	t = os.times()
+	return t[0] + t[1]
+
+
+class SleepProxy(object):
+	# stands in for the time module of the flow, sleeps are idle time of the current step
+
+	def __init__(self, prof, clock):
+		self.prof  = prof
+		self.clock = clock
+
+	def sleep(self, seconds):
+		self.prof.sleeping = True
+		start = time.time()
+		try:
+			self.clock.sleep(seconds)
+		finally:
+			self.prof.sleeping = False
+			self.prof.add_idle(time.time() - start)
+
+	def __getattr__(self, name):
+		return getattr(self.clock, name)
+
+
+class Profiler(threading.Thread):
+
+	def __init__(self, out_name, interval=0.005):
+		threading.Thread.__init__(self, name='profiler')
+		self.daemon    = True
+		self.out_name  = out_name
+		self.interval  = interval
+		self.target    = threading.current_thread().ident
+		self.running   = True
+		self.sleeping  = False
+		self.stacks    = {}
+		self.steps     = []
+		self.step      = None
+		self.waits     = {}
+		self.lock      = threading.Lock()
+
+	def run(self):
+		while self.running:
+			time.sleep(self.interval)
+			frame = sys._current_frames().get(self.target)
+			if frame == None:
+				continue
+
+			stack = []
+			while frame != None:
+				code = frame.f_code
+				stack.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), frame.f_lineno))
+				frame = frame.f_back
+			stack.reverse()
+			if self.step != None:
+				stack.insert(0, self.step['name'])
+			if self.sleeping:
+				stack.append('[sleep]')
+
+			key = ';'.join(stack)
+			with self.lock:
+				self.stacks[key] = self.stacks.get(key, 0) + 1
+
+	def mark(self, name):
+		now = time.time()
+		cpu = cpu_time()
+		if self.step != None:
+			self.step['wall'] = now - self.step['start']
+			self.step['cpu']  = cpu - self.step['cpu_start']
+		self.step = {'name': name, 'start': now, 'cpu_start': cpu, 'wall': 0.0, 'cpu': 0.0, 'idle': 0.0}
+		self.steps.append(self.step)
+
+	def add_idle(self, seconds):
+		if self.step != None:
+			self.step['idle'] += seconds
+
+	def wrap_wait(self, wait):
+		# wall and cpu time of every call site of a wait function
+		def profiled_wait(seconds, step, *args, **kwargs):
+			caller = sys._getframe(1)
+			site = '%s:%d' % (caller.f_code.co_name, caller.f_lineno)
+			start = time.time()
+			cpu = cpu_time()
+			try:
+				return wait(seconds, step, *args, **kwargs)
+			finally:
+				stat = self.waits.setdefault(site, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+				stat['calls'] += 1
+				stat['wall']  += time.time() - start
+				stat['cpu']   += cpu_time() - cpu
+		return profiled_wait
+
+	def stop(self):
+		self.running = False
+		self.join()
+		self.mark('end')
+		self.steps.pop()
+
+		fp = open(self.out_name + '.folded', 'w')
+		try:
+			for key in sorted(self.stacks.keys()):
+				fp.write('%s %d\n' % (key, self.stacks[key]))
+		finally:
+			fp.close()
+
+		lines = []
+		lines.append('%-16s %9s %9s %9s %9s' % ('step', 'wall(s)', 'cpu(s)', 'idle(s)', 'busy(s)'))
+		for s in self.steps:
+			lines.append('%-16s %9.2f %9.2f %9.2f %9.2f' % (s['name'], s['wall'], s['cpu'], s['idle'], s['wall'] - s['idle']))
+		lines.append('')
+		lines.append('%-32s %6s %9s %9s %6s' % ('wait', 'calls', 'wall(s)', 'cpu(s)', 'kind'))
+		for site in sorted(self.waits.keys()):
+			w = self.waits[site]
+			# a wait which spends more than a tenth of its time on the cpu is polling, not idling
+			kind = 'idle'
+			if w['wall'] > 0 and w['cpu'] / w['wall'] > 0.1:
+				kind = 'busy'
+			lines.append('%-32s %6d %9.2f %9.2f %6s' % (site, w['calls'], w['wall'], w['cpu'], kind))
+
+		fp = open(self.out_name + '.txt', 'w')
+		try:
+			fp.write('\n'.join(lines) + '\n')
+		finally:
+			fp.close()
+
+		for line in lines:
+			logger.info(line)
+
+
+def start(out_name):
+	global profiler
+	profiler = Profiler(out_name)
+	robot.use(clock_target=SleepProxy(profiler, robot.clock.target))
+	# settle.wait does not call failfast.wait, so no wait is counted twice
+	failfast.wait = profiler.wrap_wait(failfast.wait)
+	settle.wait   = profiler.wrap_wait(settle.wait)
+	profiler.start()
+	profiler.mark('start')
+	return profiler
+
+
+def mark(name):
+	if profiler != None:
+		profiler.mark(name)
+
+
+def stop():
+	global profiler
+	if profiler != None:
+		profiler.stop()
+		profiler = None
@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+# ! -*- coding: utf-8 -*-
+# @Time    :2018/04/02 09:45
+# @File    :recorder.py
+
+"""
+Record a real LaunchSession.py run and replay it faster than real time.
+
+Record: set [default] record_file in scard_auto.conf. LaunchSession.py then talks to pyautogui through
+a Recorder and to subprocess through a RecordedShell, which write window title lookups, detector calls
+with the screen frame they searched, screenshots, commands with their output, input actions and the exit
+code with their time into a zip file:
+	events.json      one json event per line, "t" is the second since the start of the run when the
+	                 call started, "duration" the seconds the call took
+	frames/N.png     the screen frame of a detector call or screenshot, unchanged frames are stored once
+
+Replay (runs on Linux, no Citrix, no smart card):
+	python recorder.py <record file or directory> [speed]
+LaunchSession.py is imported with a fake pyautogui and a virtual clock. Window lookups, screenshots and
+commands answer from the recorded timeline, template search runs the real matching on the recorded frame.
+Sleeps and the recorded duration of every lookup, search, screenshot and command move the virtual clock
+(divided by speed when speed is given), so polling loops see the states the recorded run saw. Result code
+and input actions are compared with the recording.
+"""
+
+import os
+import sys
+import time
+import json
+import zipfile
+import logging
+import StringIO
+import subprocess
+
+
+class RecordedWindow(object):
+
+	def __init__(self, recorder, title, win):
+		self.recorder = recorder
+		self.title    = title
+		self.win      = win
+
+	def set_foreground(self):
+		self.recorder.event('action', name='set_foreground', args=[self.title])
+		return self.win.set_foreground()
+
+	def get_position(self):
+		return self.win.get_position()
+
+	def __getattr__(self, name):
+		return getattr(self.win, name)
+
+
+class Recorder(object):
+
+	def __init__(self, gui, record_file, meta):
+		self.gui        = gui
+		self.start      = time.time()
+		self.frames     = 0
+		self.last_frame = None
+		self.zip        = zipfile.ZipFile(record_file, 'w', zipfile.ZIP_DEFLATED)
+		self.events     = []
+		self.event('meta', **meta)
+
+	def event(self, kind, start=None, **fields):
+		# a call event has the time it started and its duration, replay moves its clock by the duration
+		now = time.time()
+		if start == None:
+			start = now
+		else:
+			fields['duration'] = round(now - start, 3)
+		fields['kind'] = kind
+		fields['t']    = round(start - self.start, 3)
+		self.events.append(json.dumps(fields))
+
+	def add_frame(self, img):
+		from PIL import ImageChops
+
+		# settle samples repeat the same frame many times, store it once
+		if self.last_frame != None:
+			last, name = self.last_frame
+			if last.size == img.size and last.mode == img.mode and ImageChops.difference(last, img).getbbox() == None:
+				return name
+
+		name = 'frames/%d.png' % (self.frames)
+		self.frames += 1
+		buf = StringIO.StringIO()
+		img.save(buf, 'PNG')
+		self.zip.writestr(name, buf.getvalue())
+		self.last_frame = (img, name)
+		return name
+
+	def close(self, code):
+		# called by exit_robot and again by the finally around the flow, only the first call counts
+		if self.zip == None:
+			return
+		self.event('exit', code=code)
+		self.zip.writestr('events.json', '\n'.join(self.events))
+		self.zip.close()
+		self.zip = None
+
+	def getWindow(self, title):
+		start = time.time()
+		win = self.gui.getWindow(title)
+		if win == None:
+			self.event('window', start, title=title, found=False)
+			return None
+
+		try:
+			position = list(win.get_position())
+		except Exception:
+			position = None
+		self.event('window', start, title=title, found=True, position=position)
+		return RecordedWindow(self, title, win)
+
+	def screenshot(self, region=None):
+		# settle.py samples the screen through this
+		start = time.time()
+		img = self.gui.screenshot(region=region)
+		frame = None
+		if img != None:
+			frame = self.add_frame(img)
+		self.event('screenshot', start, frame=frame, region=region)
+		return img
+
+	def locateOnScreen(self, image, **kwargs):
+		# search the recorded frame, so replay sees exactly what this run saw
+		start  = time.time()
+		screen = self.gui.screenshot()
+		frame  = self.add_frame(screen)
+		region = kwargs.pop('region', None)
+		haystack = screen
+		if region != None:
+			haystack = screen.crop((region[0], region[1], region[0] + region[2], region[1] + region[3]))
+
+		loc = self.gui.locate(image, haystack, **kwargs)
+		if loc != None and region != None:
+			loc = (loc[0] + region[0], loc[1] + region[1], loc[2], loc[3])
+
+		template = getattr(image, 'filename', image)
+		self.event('locate', start, template=os.path.basename(str(template)), frame=frame, region=region, result=loc and list(loc))
+		return loc
+
+	def click(self, *args, **kwargs):
+		self.event('action', name='click', args=list(args))
+		return self.gui.click(*args, **kwargs)
+
+	def typewrite(self, message, interval=0.0):
+		self.event('action', name='typewrite', args=[message], interval=interval)
+		return self.gui.typewrite(message, interval=interval)
+
+	def press(self, key):
+		self.event('action', name='press', args=[key])
+		return self.gui.press(key)
+
+	def keyDown(self, key):
+		self.event('action', name='keyDown', args=[key])
+		return self.gui.keyDown(key)
+
+	def keyUp(self, key):
+		self.event('action', name='keyUp', args=[key])
+		return self.gui.keyUp(key)
+
+	def __getattr__(self, name):
+		# position, size, center ... are not recorded
+		return getattr(self.gui, name)
+
+
+class RecordedShell(object):
+	# subprocess of the flow, tasklist polls of failfast.ProcessExit decide a 2103, so their output is recorded
+
+	def __init__(self, recorder, shell):
+		self.recorder = recorder
+		self.shell    = shell
+
+	def run(self, name, args, kwargs):
+		# output is bytes in the console code page, latin-1 keeps every byte through json
+		start = time.time()
+		try:
+			result = getattr(self.shell, name)(args, **kwargs)
+		except subprocess.CalledProcessError as e:
+			self.recorder.event('shell', start, name=name, args=args, failed=True, returncode=e.returncode,
+				output=(e.output or '').decode('latin-1'))
+			raise
+		except Exception as e:
+			self.recorder.event('shell', start, name=name, args=args, error=str(e))
+			raise
+
+		if name == 'call':
+			self.recorder.event('shell', start, name=name, args=args, returncode=result)
+		else:
+			self.recorder.event('shell', start, name=name, args=args, output=result.decode('latin-1'))
+		return result
+
+	def check_output(self, args, **kwargs):
+		return self.run('check_output', args, kwargs)
+
+	def call(self, args, **kwargs):
+		return self.run('call', args, kwargs)
+
+	def __getattr__(self, name):
+		return getattr(self.shell, name)
+
+
+class ReplayClock(object):
+
+	def __init__(self, speed=0):
+		self.now   = 0.0
+		self.speed = speed
+
+	def sleep(self, seconds):
+		self.now += seconds
+		if self.speed > 0:
+			time.sleep(seconds / float(self.speed))
+
+	def time(self):
+		return self.now
+
+	def __getattr__(self, name):
+		return getattr(time, name)
+
+
+class ReplayWindow(object):
+
+	def __init__(self, gui, title, position):
+		self.gui      = gui
+		self.title    = title
+		self.position = position
+
+	def set_foreground(self):
+		self.gui.action('set_foreground', [self.title])
+
+	def get_position(self):
+		return tuple(self.position or (0, 0, 0, 0))
+
+
+class ReplayGui(object):
+
+	def __init__(self, record_file, clock):
+		self.zip     = zipfile.ZipFile(record_file, 'r')
+		self.clock   = clock
+		self.events  = [json.loads(line) for line in self.zip.read('events.json').splitlines() if line]
+		self.meta    = self.events[0]
+		self.actions = []
+		self.mouse   = (0, 0)
+
+	def recorded(self, kind, **match):
+		return [e for e in self.events if e['kind'] == kind and all([e.get(k) == match[k] for k in match])]
+
+	def last_before(self, events):
+		# state at the virtual time: the last recorded call started not after it,
+		# recorded times are rounded to milliseconds
+		last = None
+		for e in events:
+			if e['t'] > self.clock.now + 0.001:
+				break
+			last = e
+		return last
+
+	def replay_call(self, events):
+		# answer like the recorded call and take as long as it took
+		e = self.last_before(events)
+		if e != None:
+			self.clock.sleep(e.get('duration', 0))
+		return e
+
+	def frame(self, name):
+		from PIL import Image
+		return Image.open(StringIO.StringIO(self.zip.read(name)))
+
+	def action(self, name, args):
+		self.actions.append([name, args])
+
+	def getWindow(self, title):
+		e = self.replay_call(self.recorded('window', title=title))
+		if e == None or not e['found']:
+			return None
+		return ReplayWindow(self, title, e.get('position'))
+
+	def locateOnScreen(self, image, **kwargs):
+		import pyscreeze
+		from PIL import Image
+
+		e = self.replay_call(self.recorded('locate'))
+		if e == None:
+			return None
+
+		screen = self.frame(e['frame'])
+		region = kwargs.pop('region', None)
+		if region != None:
+			screen = screen.crop((region[0], region[1], region[0] + region[2], region[1] + region[3]))
+
+		if not hasattr(image, 'size'):
+			image = Image.open(template_path(image))
+
+		loc = pyscreeze.locate(image, screen, **kwargs)
+		if loc != None and region != None:
+			loc = (loc[0] + region[0], loc[1] + region[1], loc[2], loc[3])
+		return loc
+
+	def screenshot(self, region=None):
+		# the recorded frame already is the region the recorded run asked for
+		e = self.replay_call(self.recorded('screenshot'))
+		if e == None or e['frame'] == None:
+			return None
+		return self.frame(e['frame'])
+
+	def center(self, loc):
+		return (loc[0] + int(loc[2] / 2), loc[1] + int(loc[3] / 2))
+
+	def size(self):
+		return tuple(self.meta.get('screen', (1920, 1080)))
+
+	def position(self):
+		return self.mouse
+
+	def click(self, x=None, y=None, *args, **kwargs):
+		if x != None:
+			self.mouse = (x, y)
+		self.action('click', [x, y])
+
+	def typewrite(self, message, interval=0.0):
+		self.action('typewrite', [message])
+		self.clock.sleep(len(message) * interval)
+
+	def press(self, key):
+		self.action('press', [key])
+
+	def keyDown(self, key):
+		self.action('keyDown', [key])
+
+	def keyUp(self, key):
+		self.action('keyUp', [key])
+
+
+def template_path(name):
+	# templates are found case insensitive like on the windows robot, e.g. desktops.png -> desktops.PNG
+	if os.path.exists(name):
+		return name
+	folder = os.path.dirname(name) or '.'
+	for f in os.listdir(folder):
+		if f.lower() == os.path.basename(name).lower():
+			return os.path.join(folder, f)
+	return name
+
+
+class ReplayShell(object):
+	# stands in for subprocess, nothing is started during replay, commands answer like the recorded ones
+
+	def __init__(self, gui):
+		self.gui = gui
+
+	def run(self, name, args, default):
+		e = self.gui.replay_call(self.gui.recorded('shell', name=name, args=args))
+		if e == None:
+			return default
+		if 'error' in e:
+			raise OSError(e['error'])
+		if e.get('failed'):
+			raise subprocess.CalledProcessError(e['returncode'], args, e['output'].encode('latin-1'))
+		if name == 'call':
+			return e['returncode']
+		return e['output'].encode('latin-1')
+
+	def check_output(self, args, **kwargs):
+		return self.run('check_output', args, '')
+
+	def call(self, args, **kwargs):
+		return self.run('call', args, 0)
+
+
+def replay(record_file, speed=0):
+	clock = ReplayClock(speed)
+	gui   = ReplayGui(record_file, clock)
+
+	# there is no pyautogui on Linux, the modules of the flow must not import the real one
+	sys.modules['pyautogui'] = gui
+	sys.modules.pop('LaunchSession', None)
+	import LaunchSession
+	import robot
+	import settle
+
+	LaunchSession.logger = logging.getLogger('replay')
+
+	meta = gui.meta
+	display = robot.Display('replay', meta.get('session'), gui, clock, ReplayShell(gui))
+	for key in meta['globals']:
+		setattr(LaunchSession, key, meta['globals'][key])
+	# [times] settle_time lives in settle.py, records without it ran with the default
+	settle.stable_time = meta.get('settle_time', 1.0)
+	# the store api is never called during replay
+	LaunchSession.store_url = ""
+
+	start = time.time()
+	try:
+		if meta['testType'] == 3 and meta['testExt'] > 0:
+			code = LaunchSession.run_flow(LaunchSession.reconnect_session, meta['resourcetype'], meta['app_name'], meta['ddc_url'], meta['VDA_name'], meta['PIN_passwd'], display)
+		else:
+			code = LaunchSession.run_flow(LaunchSession.launch_session, meta['resourcetype'], meta['app_name'], meta['ddc_url'], meta['VDA_name'], meta['PIN_passwd'], display)
+	except Exception as e:
+		# a recorded run ended by an exception has the exit code of LaunchSession.record_error
+		LaunchSession.logger.info('replay ended by [%s].' % (e))
+		code = LaunchSession.record_error
+	wall = time.time() - start
+
+	recorded_exit    = gui.recorded('exit')
+	recorded_actions = [[e['name'], e['args']] for e in gui.recorded('action')]
+
+	return {
+		'file'          : record_file,
+		'code'          : code,
+		'recorded_code' : recorded_exit and recorded_exit[-1]['code'],
+		'recorded_time' : gui.events[-1]['t'],
+		'virtual_time'  : clock.now,
+		'wall_time'     : wall,
+		'actions_match' : json.loads(json.dumps(gui.actions)) == recorded_actions,
+	}
+
+
+if __name__ == "__main__":
+
+	if len(sys.argv) < 2:
+		print "usage: python recorder.py <record file or directory> [speed]"
+		sys.exit(1)
+
+	path  = sys.argv[1]
+	speed = 0
+	if len(sys.argv) > 2:
+		speed = float(sys.argv[2])
+
+	if os.path.isdir(path):
+		files = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith('.rec')]
+	else:
+		files = [path]
+
+	failed = 0
+	for f in files:
+		r = replay(f, speed)
+		match = (r['code'] == r['recorded_code']) and r['actions_match']
+		if not match:
+			failed += 1
+		print "[%s] code [%s/%s] actions match [%s] recorded [%.1f]s virtual [%.1f]s wall [%.2f]s" % (
+			os.path.basename(f), r['code'], r['recorded_code'], r['actions_match'],
+			r['recorded_time'], r['virtual_time'], r['wall_time'])
+
+	print "replay [%d] records, [%d] differ from the recording." % (len(files), failed)
+	sys.exit(failed)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# ! -*- coding: utf-8 -*-
+# @Time    :2018/05/08 09:40
+# @File    :robot.py
+
+"""
+Screen and input, clock and shell of the launch/reconnect flow.
+
+LaunchSession.py, failfast.py and settle.py reach pyautogui, time and subprocess only through these
+switches. Recording (recorder.Recorder), replay (recorded screen, virtual clock) and profiling (idle time
+of sleeps) change what a switch forwards to once with use(), instead of patching every module.
+
+A Display is the handle of what one worker drives: the screen, pointer and keyboard of its windows
+session, with the clock and shell to use. The flows get it as parameter and bind the switches to it.
+Windows gives every logon session its own desktop and input, and a process only reaches the session it
+runs in, so displays.py runs every worker as its own process in its own session.
+"""
+
+import os
+import time
+import ctypes
+import subprocess
+
+import pyautogui
+
+
+class Switch(object):
+
+	def __init__(self, target):
+		self.target = target
+
+	def __getattr__(self, name):
+		return getattr(self.target, name)
+
+
+gui   = Switch(pyautogui)
+clock = Switch(time)
+shell = Switch(subprocess)
+
+
+def use(gui_target=None, clock_target=None, shell_target=None):
+	if gui_target != None:
+		gui.target = gui_target
+	if clock_target != None:
+		clock.target = clock_target
+	if shell_target != None:
+		shell.target = shell_target
+
+
+class Display(object):
+
+	def __init__(self, name, session=None, gui=pyautogui, clock=time, shell=subprocess):
+		self.name    = name
+		self.session = session
+		self.gui     = gui
+		self.clock   = clock
+		self.shell   = shell
+
+
+# the display the switches forward to
+display = None
+
+
+def bind(handle):
+	# profiling changes the clock of the bound display later, binding it again must not undo that
+	global display
+	if handle is display:
+		return
+	display = handle
+	use(handle.gui, handle.clock, handle.shell)
+
+
+def session_id():
+	# windows session this process runs in, None when there are no sessions
+	try:
+		sid = ctypes.c_ulong()
+		if ctypes.windll.kernel32.ProcessIdToSessionId(os.getpid(), ctypes.byref(sid)):
+			return sid.value
+	except AttributeError:
+		pass
+	return None
+
+
+def session_display():
+	# display of this process: the screen and input of its windows session
+	sid = session_id()
+	return Display('session %s' % (sid), sid)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# ! -*- coding: utf-8 -*-
+# @Time    :2018/03/20 16:40
+# @File    :sessionapi.py
+
+"""
+Python port of the session part of password/SessionLaunch.ICAClient.psm1 (Store Services API 2.5).
+
+Get-AvailableSessions, Get-SessionByName, Resume-Session and Stop-Session are implemented with
+urllib2, so LaunchSession.py can resume a disconnected session directly instead of clicking
+the Receiver UI. Like the psm1, only explicit forms authentication is supported and the store URL
+must be the Store service (.../Citrix/Store), not the Receiver for Web (.../Citrix/StoreWeb).
+"""
+
+import os
+import re
+import ssl
+import time
+import socket
+import fnmatch
+import logging
+import tempfile
+import subprocess
+import urllib
+import urllib2
+import xml.etree.ElementTree as ET
+
+
+logger = logging.getLogger('test')
+
+citrix_auth_re = re.compile(r'CitrixAuth realm="(.*?)", reqtokentemplate="(.*?)", reason="(.*?)", locations="(.*?)", serviceroot-hint="(.*?)"$')
+
+requesttoken_xml = '''<?xml version="1.0" encoding="utf-8" ?>
+<requesttoken xmlns="http://citrix.com/delivery-services/1-0/auth/requesttoken">
+<for-service>%s</for-service>
+<for-service-url>%s</for-service-url>
+<reqtokentemplate></reqtokentemplate>
+<requested-lifetime>01:00:00</requested-lifetime>
+</requesttoken>'''
+
+launchparams_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<launchparams xmlns="http://citrix.com/delivery-services/1-0/launchparams">
+<deviceId>%s</deviceId>
+<clientName>%s</clientName>
+<audio>high</audio>
+<display>seamless</display>
+<displayPercent>100</displayPercent>
+<transparentKeyPassthrough>fullscreenonly</transparentKeyPassthrough>
+<specialFolderRedirection>false</specialFolderRedirection>
+<clearTypeRemoting>false</clearTypeRemoting>
+<showDesktopViewer>true</showDesktopViewer>
+<colourDepth>16</colourDepth>
+</launchparams>'''
+
+ica_client_paths = [
+	os.path.join(os.environ.get('ProgramFiles', ''), 'Citrix', 'ICA Client', 'wfica32.exe'),
+	os.path.join(os.environ.get('ProgramFiles(x86)', ''), 'Citrix', 'ICA Client', 'wfica32.exe'),
+]
+
+
+class SessionApiError(Exception):
+	pass
+
+
+def client_name():
+	return os.environ.get('COMPUTERNAME', socket.gethostname())
+
+
+def local_name(tag):
+	# '{namespace}name' -> 'name'
+	return tag.split('}')[-1]
+
+
+def find_child(elem, name):
+	for child in elem:
+		if local_name(child.tag) == name:
+			return child
+	return None
+
+
+def find_all(elem, name):
+	return [e for e in elem.iter() if local_name(e.tag) == name]
+
+
+def field(elem, name):
+	# attribute or child element text, like the dot notation of powershell xml objects
+	if elem == None:
+		return None
+	if name in elem.attrib:
+		return elem.attrib[name]
+	child = find_child(elem, name)
+	if child != None:
+		return (child.text or '').strip()
+	return None
+
+
+def http_request(url, method='GET', accept=None, content_type=None, body=None, headers=None, timeout=30):
+	# returns (status code, response headers, body) also for 4xx/5xx answers, like Invoke-HttpRequest
+	req = urllib2.Request(url, data=body)
+	req.get_method = lambda: method
+	if accept != None:
+		req.add_header('Accept', accept)
+	if content_type != None:
+		req.add_header('Content-Type', content_type)
+	if headers != None:
+		for key in headers:
+			req.add_header(key, headers[key])
+
+	kwargs = {'timeout': timeout}
+	if url.startswith('https') and hasattr(ssl, '_create_unverified_context'):
+		kwargs['context'] = ssl._create_unverified_context()
+
+	try:
+		resp = urllib2.urlopen(req, **kwargs)
+	except urllib2.HTTPError as e:
+		resp = e
+
+	try:
+		return (resp.getcode(), resp.info(), resp.read())
+	finally:
+		resp.close()
+
+
+def host_uri(url):
+	m = re.match(r'^(\w+://[^/]+)', url)
+	return m.group(1)
+
+
+def parse_citrix_auth(auth_string):
+	m = citrix_auth_re.match(auth_string or '')
+	if m == None:
+		raise SessionApiError('The challenge string could not be parsed [%s].' % (auth_string))
+	return {
+		'for-service'     : m.group(1),
+		'template'        : m.group(2),
+		'reason'          : m.group(3),
+		'url-list'        : m.group(4).split('|'),
+		'for-service-url' : m.group(5),
+	}
+
+
+def read_token(body):
+	root = ET.fromstring(body)
+	if local_name(root.tag) != 'requesttokenresponse':
+		return None
+	return field(root, 'token')
+
+
+def credential_message(state_context, domain, user_name, password, form_body):
+	if '<ID>domain</ID>' in form_body:
+		params = [('StateContext', state_context), ('loginBtn', 'Log On'), ('password', password),
+			('saveCredentials', 'false'), ('username', user_name), ('domain', domain)]
+	else:
+		params = [('StateContext', state_context), ('loginBtn', 'Log On'), ('password', password),
+			('saveCredentials', 'false'), ('username', '%s\\%s' % (domain, user_name))]
+	return urllib.urlencode(params)
+
+
+def request_token(auth_string, domain, user_name, password):
+	# Security Token Service API v1.2, explicit forms authentication only (see Request-Token)
+	auth = parse_citrix_auth(auth_string)
+	body = requesttoken_xml % (auth['for-service'], auth['for-service-url'])
+
+	for url in auth['url-list']:
+		params = {
+			'method'       : 'POST',
+			'accept'       : 'application/vnd.citrix.requesttokenresponse+xml, application/vnd.citrix.requesttokenchoices+xml',
+			'content_type' : 'application/vnd.citrix.requesttoken+xml',
+			'body'         : body,
+		}
+		code, headers, resp_body = http_request(url, **params)
+
+		if code == 401:
+			# another authenticate step, get the token of that service first
+			parent = request_token(headers.getheader('WWW-Authenticate'), domain, user_name, password)
+			params['headers'] = {'Authorization': 'CitrixAuth %s' % (parent)}
+			code, headers, resp_body = http_request(url, **params)
+			token = read_token(resp_body)
+			if token != None:
+				return token
+			continue
+
+		if code == 300:
+			choices = ET.fromstring(resp_body)
+			for choice in find_all(choices, 'choice'):
+				location = field(choice, 'location')
+				code, headers, form_body = http_request(location, method='POST',
+					accept='application/vnd.citrix.requesttokenresponse+xml, text/xml, application/vnd.citrix.authenticateresponse-1+xml',
+					content_type='application/vnd.citrix.requesttoken+xml', body=body)
+				if code != 200:
+					continue
+
+				form = ET.fromstring(form_body)
+				postback = find_all(form, 'PostBack')
+				if len(postback) == 0:
+					continue
+
+				cookie = headers.getheader('Set-Cookie')
+				extra = {}
+				if cookie != None:
+					extra['Cookie'] = cookie
+
+				code, headers, token_body = http_request(host_uri(location) + postback[0].text.strip(), method='POST',
+					accept='application/vnd.citrix.authenticateresponse-1+xml, application/vnd.citrix.requesttokenresponse+xml',
+					content_type='application/x-www-form-urlencoded',
+					body=credential_message(field(form, 'StateContext'), domain, user_name, password, form_body),
+					headers=extra)
+				if code != 200:
+					raise SessionApiError('Request token unexpected response [%d].' % (code))
+
+				token = read_token(token_body)
+				if token == None:
+					raise SessionApiError('Failed to authenticate [%s].' % (user_name))
+				return token
+
+	raise SessionApiError('Can not get token for [%s].' % (auth['for-service-url']))
+
+
+class StoreSession(object):
+
+	def __init__(self, store_url, domain, user_name, password, timeout=30):
+		self.store_url = store_url.rstrip('/')
+		self.domain    = domain
+		self.user_name = user_name
+		self.password  = password
+		self.timeout   = timeout
+		self.token     = None
+
+	def post(self, url, accept, content_type, body):
+		# send with the cached token, on 401 follow the CitrixAuth challenge once and send again
+		for i in range(2):
+			headers = {}
+			if self.token != None:
+				headers['Authorization'] = 'CitrixAuth %s' % (self.token)
+			code, resp_headers, resp_body = http_request(url, method='POST', accept=accept,
+				content_type=content_type, body=body, headers=headers, timeout=self.timeout)
+			if code == 401 and i == 0:
+				self.token = request_token(resp_headers.getheader('WWW-Authenticate'),
+					self.domain, self.user_name, self.password)
+				continue
+			if code != 200:
+				raise SessionApiError('[%s] HTTP error code [%d].' % (url, code))
+			return resp_body
+
+	def session_params(self, tickets=None, include_active=False, apps_only=False):
+		name = client_name()
+		xml = '<?xml version="1.0"?>\n<sessionParams xmlns="http://citrix.com/delivery-services/1-0/sessionparams">'
+		xml += '<clientName>%s</clientName><deviceId>%s</deviceId>' % (name, name)
+		if tickets:
+			xml += '<tickets>' + ''.join(['<ticket>%s</ticket>' % (t) for t in tickets]) + '</tickets>'
+		else:
+			xml += '<includeActiveSessions>%s</includeActiveSessions>' % (str(include_active).lower())
+			xml += '<appSessionsOnly>%s</appSessionsOnly>' % (str(apps_only).lower())
+		xml += '</sessionParams>'
+		return xml
+
+	def get_available_sessions(self, include_active=False, apps_only=False):
+		body = self.post(self.store_url + '/sessions/v1/available',
+			'application/vnd.citrix.sessionstate+xml',
+			'application/vnd.citrix.sessionparams+xml;charset=utf-8',
+			self.session_params(include_active=include_active, apps_only=apps_only))
+
+		sessions = []
+		for sess in find_all(ET.fromstring(body), 'session'):
+			sessions.append({
+				'initialapp' : field(sess, 'initialapp'),
+				'launchica'  : field(find_child(sess, 'launchica'), 'url'),
+			})
+		return sessions
+
+	def get_session_by_name(self, sessions, app_name):
+		# wildcard match on initialapp, like "-like" in Get-SessionByName
+		return [s for s in sessions if s['initialapp'] != None and fnmatch.fnmatch(s['initialapp'], app_name)]
+
+	def get_ica_file(self, ica_url, retry=30):
+		params = launchparams_xml % (client_name(), client_name())
+		for i in range(retry + 1):
+			body = self.post(ica_url, 'application/vnd.citrix.launchdata+xml',
+				'application/vnd.citrix.launchparams+xml', params)
+
+			launch = ET.fromstring(body)
+			status = field(launch, 'status')
+			result = find_child(launch, 'result')
+			result_type = field(result, 'type')
+
+			if status == 'success':
+				return find_all(launch, 'ica')[0].text
+
+			if status == 'retry':
+				retry_info = find_child(result, result_type)
+				after = field(retry_info, 'after')
+				if after:
+					time.sleep(float(after))
+				ica_url = field(retry_info, 'url') or ica_url
+				continue
+
+			error = find_child(result, result_type)
+			raise SessionApiError('Error encountered getting ICA [%s:%s].' % (field(error, 'id'), field(error, 'text')))
+
+		raise SessionApiError('Retry reached maximum times, abandon.')
+
+	def resume_session(self, app_name, launch=True):
+		sessions = self.get_session_by_name(self.get_available_sessions(), app_name)
+		if len(sessions) > 1:
+			raise SessionApiError('More than one session with the [%s] found.' % (app_name))
+		if len(sessions) == 0:
+			raise SessionApiError('No sessions found with name matches [%s].' % (app_name))
+
+		ica = self.get_ica_file(sessions[0]['launchica'])
+
+		fd, ica_path = tempfile.mkstemp(suffix='.ica')
+		os.write(fd, ica.encode('utf-8'))
+		os.close(fd)
+
+		ticket = None
+		for line in ica.splitlines():
+			if line.startswith('LogonTicket='):
+				ticket = line.split('=', 1)[1].strip()
+
+		if launch:
+			subprocess.Popen([ica_client_path(), ica_path])
+
+		return {'ica': ica_path, 'ticket': ticket}
+
+	def stop_session(self, tickets, action='Disconnect'):
+		if action == 'Logoff':
+			url = self.store_url + '/sessions/v1/logoff'
+		else:
+			url = self.store_url + '/sessions/v1/disconnect'
+
+		body = self.post(url, 'application/vnd.citrix.sessionresults+xml',
+			'application/vnd.citrix.sessionparams+xml;charset=utf-8',
+			self.session_params(tickets=tickets))
+		return field(ET.fromstring(body), 'status') == 'success'
+
+
+def ica_client_path():
+	for path in ica_client_paths:
+		if os.path.exists(path):
+			return path
+	raise SessionApiError('Could not find "ICA Client" under ProgramFiles folder.')
+
+
+def remove_ica(ica_path):
+	# the ica file holds the logon ticket, it must not stay behind once the client has read it
+	try:
+		os.remove(ica_path)
+	except OSError as e:
+		logger.info('remove ica file [%s] failed due to [%s].' % (ica_path, e))
+
+
+def resume(store_url, domain, user_name, password, app_name):
+	# resume the disconnected session of app_name, return the ica file given to the client,
+	# False when the GUI flow is needed; the caller removes the file with remove_ica()
+	try:
+		store = StoreSession(store_url, domain, user_name, password)
+		info = store.resume_session(app_name)
+	except Exception as e:
+		# any failure, also a malformed or partial answer of the store, falls back to the GUI flow
+		logger.info('resume session [%s] by store api failed due to [%s].' % (app_name, e))
+		return False
+
+	logger.info('resume session [%s] by store api, ica file is [%s].' % (app_name, info['ica']))
+	return info['ica']
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# ! -*- coding: utf-8 -*-
+# @Time    :2018/04/28 10:05
+# @File    :settle.py
+
+"""
+Wait until a screen region stops changing instead of sleeping a fixed time.
+
+Frames of the region are shrunk by nearest neighbour sampling (one pixel of every 8x8 block) to grayscale
+and compared with the previous frame by ImageChops.difference, both done inside PIL, so comparing costs
+under a millisecond (a filtered resize of a full screen costs 5-10 ms). The screenshot itself is the main
+cost of a sample, so wait() stretches the sampling interval to keep sampling under sample_budget of the time.
+wait() returns as soon as the region has been stable for stable_time seconds, or when the deadline passes,
+and checks the failfast signatures of the step while it waits. A wait for a launch instead of a redraw
+passes need_change: the screen is still static right after the key press, so only stability after a
+change counts there.
+
+	python settle.py [samples] [screenshot.png]
+measures the cost of one sample on the robot: live full screen capture, shrink and compare. With a
+screenshot file only shrink and compare are measured.
+"""
+
+import sys
+import time
+import logging
+
+from PIL import Image, ImageChops, ImageStat
+
+import robot
+import failfast
+
+
+logger = logging.getLogger('test')
+
+# seconds the region must stay unchanged, [times] settle_time
+stable_time = 1.0
+
+# share of the waiting time that may be spent taking and comparing samples
+sample_budget = 0.1
+
+
+def shrink(img, scale=8):
+	w, h = img.size
+	return img.resize((max(1, w / scale), max(1, h / scale)), Image.NEAREST).convert('L')
+
+
+def difference(a, b):
+	# mean absolute difference of two shrunk frames, 0 - 255
+	return ImageStat.Stat(ImageChops.difference(a, b)).mean[0]
+
+
+def sample(region=None, scale=8):
+	img = robot.gui.screenshot(region=region)
+	if img == None:
+		return None
+	return shrink(img, scale)
+
+
+def same(a, b, threshold):
+	return a != None and b != None and a.size == b.size and difference(a, b) <= threshold
+
+
+def wait(deadline, step, region=None, interval=0.2, threshold=1.0, scale=8, need_change=False):
+	# returns True when the region settled, False when the deadline passed
+	start   = robot.clock.time()
+	end     = start + deadline
+	first   = None
+	last    = None
+	stable  = None
+	changed = not need_change
+
+	while True:
+		failfast.check(step)
+
+		now = robot.clock.time()
+		frame = sample(region, scale)
+		cost = robot.clock.time() - now
+
+		if first == None:
+			first = frame
+		elif not changed and frame != None and not same(frame, first, threshold):
+			changed = True
+
+		if changed and same(frame, last, threshold):
+			if stable == None:
+				stable = now
+			if now - stable >= stable_time:
+				logger.info('screen settled after [%.2f] seconds.' % (now - start))
+				return True
+		else:
+			stable = None
+		last = frame
+
+		if now >= end:
+			if changed:
+				logger.info('screen not settled in [%.2f] seconds.' % (deadline))
+			else:
+				logger.info('screen not changed in [%.2f] seconds.' % (deadline))
+			return False
+		# a slow capture must not turn the wait into busy polling
+		pause = max(interval, cost * (1 - sample_budget) / sample_budget)
+		robot.clock.sleep(max(0, min(pause, end - robot.clock.time())))
+
+
+def bench(samples=50, image=None, interval=0.2):
+	if image != None:
+		frames = [Image.open(image)]
+		capture = None
+	else:
+		start = time.time()
+		frames = [robot.gui.screenshot() for i in range(samples)]
+		capture = (time.time() - start) / samples
+
+	start = time.time()
+	last = None
+	for i in range(samples):
+		frame = shrink(frames[i % len(frames)])
+		if last != None:
+			difference(frame, last)
+		last = frame
+	compare = (time.time() - start) / samples
+
+	print "screen       : %dx%d" % frames[0].size
+	print "shrink+diff  : %.2f ms per sample" % (compare * 1000)
+	if capture == None:
+		print "capture      : not measured, run without a screenshot file on the robot"
+		return
+
+	cost  = capture + compare
+	pause = max(interval, cost * (1 - sample_budget) / sample_budget)
+	print "capture      : %.2f ms per sample" % (capture * 1000)
+	print "overhead     : %.1f %% at one sample every %.2f s" % (cost / (cost + interval) * 100, interval)
+	print "wait() uses  : one sample every %.2f s, %.1f %% overhead" % (pause, cost / (cost + pause) * 100)
+
+
+if __name__ == "__main__":
+
+	samples = 50
+	image = None
+	if len(sys.argv) > 1:
+		samples = int(sys.argv[1])
+	if len(sys.argv) > 2:
+		image = sys.argv[2]
+
+	bench(samples, image)
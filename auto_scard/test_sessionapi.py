@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# ! -*- coding: utf-8 -*-
+# @Time    :2018/05/07 14:20
+# @File    :test_sessionapi.py
+
+"""
+Tests of sessionapi.py against a local stub of the Store Services API, no StoreFront needed.
+
+	python -m unittest test_sessionapi
+
+The stub answers the CitrixAuth challenge, the explicit forms logon, sessions/v1/available,
+sessions/v1/disconnect and the launchica url. Every test sets the launch answers it needs.
+"""
+
+import os
+import threading
+import unittest
+import urlparse
+import BaseHTTPServer
+
+import sessionapi
+
+
+store_path   = '/Citrix/Store'
+token_path   = '/Citrix/Authentication/auth/v1/token'
+start_path   = '/Citrix/Authentication/ExplicitForms/Start'
+postback     = '/Citrix/Authentication/ExplicitForms/Authenticate'
+launch_path  = '/Citrix/Store/resources/v2/rh73demo/launchica'
+
+stub_token   = 'stub-token-1234'
+
+sessionstate_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<sessionState xmlns="http://citrix.com/delivery-services/1-0/sessionstate">
+<sessions>%s</sessions>
+</sessionState>'''
+
+session_xml = '''<session><initialapp>%s</initialapp><launchica url="%s" /></session>'''
+
+choices_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<requesttokenchoices xmlns="http://citrix.com/delivery-services/1-0/auth/requesttokenchoices">
+<choices><choice><protocol>CitrixAGBasic</protocol><location>%s</location></choice></choices>
+</requesttokenchoices>'''
+
+form_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<AuthenticateResponse xmlns="http://citrix.com/authentication/response/1">
+<Status>success</Status><Result>more-info</Result><StateContext>ctx-1</StateContext>
+<AuthenticationRequirements><PostBack>%s</PostBack><Requirements><Requirement><Credential><ID>domain</ID></Credential></Requirement></Requirements></AuthenticationRequirements>
+</AuthenticateResponse>'''
+
+token_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<requesttokenresponse xmlns="http://citrix.com/delivery-services/1-0/auth/requesttokenresponse">
+<for-service>store</for-service><token>%s</token>
+</requesttokenresponse>'''
+
+logon_failed_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<AuthenticateResponse xmlns="http://citrix.com/authentication/response/1">
+<Status>success</Status><Result>fail</Result><StateContext>ctx-1</StateContext>
+</AuthenticateResponse>'''
+
+launch_success_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<launch xmlns="http://citrix.com/delivery-services/1-0/launchdata"><status>success</status>
+<result type="ica"><ica>[ApplicationServers]
+rh73demo=
+LogonTicket=TICKET42
+</ica></result></launch>'''
+
+launch_retry_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<launch xmlns="http://citrix.com/delivery-services/1-0/launchdata"><status>retry</status>
+<result type="retry"><retry after="%s" /></result></launch>'''
+
+launch_error_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<launch xmlns="http://citrix.com/delivery-services/1-0/launchdata"><status>failure</status>
+<result type="error"><error><id>NoMoreActiveSessions</id><text>no more sessions</text></error></result></launch>'''
+
+launch_no_ica_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<launch xmlns="http://citrix.com/delivery-services/1-0/launchdata"><status>success</status>
+<result type="ica"></result></launch>'''
+
+disconnect_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<sessionResults xmlns="http://citrix.com/delivery-services/1-0/sessionresults"><status>success</status></sessionResults>'''
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+	def log_message(self, *args):
+		pass
+
+	def send(self, code, body, headers=None):
+		self.send_response(code)
+		for key in (headers or {}):
+			self.send_header(key, headers[key])
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_POST(self):
+		stub = self.server.stub
+		length = int(self.headers.getheader('Content-Length') or 0)
+		body = self.rfile.read(length)
+		path = urlparse.urlparse(self.path).path
+		stub.requests.append((path, self.headers.getheader('Authorization'), body))
+
+		if path == token_path:
+			return self.send(300, choices_xml % (stub.url(start_path)))
+		if path == start_path:
+			return self.send(200, form_xml % (postback), {'Set-Cookie': 'CtxsAuthId=stub'})
+		if path == postback:
+			form = urlparse.parse_qs(body)
+			if form.get('username') == [stub.user_name] and form.get('password') == [stub.password]:
+				return self.send(200, token_xml % (stub_token))
+			return self.send(200, logon_failed_xml)
+
+		# store service, needs the token
+		if self.headers.getheader('Authorization') != 'CitrixAuth %s' % (stub_token):
+			challenge = 'CitrixAuth realm="Store", reqtokentemplate="", reason="", locations="%s", serviceroot-hint="%s"' % (
+				stub.url(token_path), stub.url(store_path))
+			return self.send(401, '', {'WWW-Authenticate': challenge})
+
+		if path == store_path + '/sessions/v1/available':
+			return self.send(200, sessionstate_xml % (''.join(stub.sessions)))
+		if path == store_path + '/sessions/v1/disconnect':
+			return self.send(200, disconnect_xml)
+		if path == launch_path:
+			answer = stub.launches.pop(0)
+			if answer == None:
+				# broken connection, no status line
+				self.wfile.write('garbage\r\n')
+				return
+			return self.send(200, answer)
+
+		self.send(404, '')
+
+
+class StubStore(object):
+
+	def __init__(self):
+		self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), StubHandler)
+		self.server.stub = self
+		self.port      = self.server.server_address[1]
+		self.user_name = 'user1'
+		self.password  = 'secret'
+		self.requests  = []
+		self.sessions  = [session_xml % ('rh73demo', self.url(launch_path))]
+		self.launches  = [launch_success_xml]
+		self.running   = True
+		self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+		self.thread.daemon = True
+		self.thread.start()
+
+	def url(self, path):
+		return 'http://127.0.0.1:%d%s' % (self.port, path)
+
+	def stop(self):
+		if self.running:
+			self.running = False
+			self.server.shutdown()
+			self.server.server_close()
+
+
+class FakePopen(object):
+
+	calls = []
+
+	def __init__(self, args):
+		FakePopen.calls.append(args)
+
+
+class FailingPopen(object):
+
+	def __init__(self, args):
+		FakePopen.calls.append(args)
+		raise OSError(2, 'No such file or directory')
+
+
+class SessionApiTest(unittest.TestCase):
+
+	def setUp(self):
+		self.stub  = StubStore()
+		self.store = sessionapi.StoreSession(self.stub.url(store_path), 'DOMAIN', 'user1', 'secret', timeout=5)
+		self.popen = sessionapi.subprocess.Popen
+		self.client_path = sessionapi.ica_client_path
+		FakePopen.calls = []
+		sessionapi.subprocess.Popen = FakePopen
+		sessionapi.ica_client_path  = lambda: 'wfica32.exe'
+
+	def tearDown(self):
+		sessionapi.subprocess.Popen = self.popen
+		sessionapi.ica_client_path  = self.client_path
+		for args in FakePopen.calls:
+			if os.path.exists(args[1]):
+				os.remove(args[1])
+		self.stub.stop()
+
+	def resume(self):
+		return sessionapi.resume(self.stub.url(store_path), 'DOMAIN', 'user1', 'secret', 'rh73*')
+
+	def test_token_challenge(self):
+		sessions = self.store.get_available_sessions()
+
+		self.assertEqual(self.store.token, stub_token)
+		paths = [r[0] for r in self.stub.requests]
+		self.assertEqual(paths, [store_path + '/sessions/v1/available', token_path, start_path, postback,
+			store_path + '/sessions/v1/available'])
+		# the form asks for a domain field, so the user name goes without domain prefix
+		logon = urlparse.parse_qs(self.stub.requests[3][2])
+		self.assertEqual(logon['domain'], ['DOMAIN'])
+		self.assertEqual(logon['StateContext'], ['ctx-1'])
+		self.assertEqual(sessions, [{'initialapp': 'rh73demo', 'launchica': self.stub.url(launch_path)}])
+
+	def test_token_cached(self):
+		self.store.get_available_sessions()
+		count = len(self.stub.requests)
+		self.store.get_available_sessions()
+		self.assertEqual(len(self.stub.requests), count + 1)
+
+	def test_wrong_password(self):
+		self.store.password = 'wrong'
+		self.assertRaises(sessionapi.SessionApiError, self.store.get_available_sessions)
+
+	def test_session_by_name(self):
+		self.stub.sessions.append(session_xml % ('win10', self.stub.url(launch_path)))
+		sessions = self.store.get_available_sessions()
+		self.assertEqual([s['initialapp'] for s in self.store.get_session_by_name(sessions, 'rh73*')], ['rh73demo'])
+		self.assertEqual(self.store.get_session_by_name(sessions, 'rhel*'), [])
+
+	def test_launch_success(self):
+		ica = self.store.get_ica_file(self.stub.url(launch_path))
+		self.assertTrue('LogonTicket=TICKET42' in ica)
+
+	def test_launch_retry(self):
+		self.stub.launches = [launch_retry_xml % ('0'), launch_retry_xml % ('0'), launch_success_xml]
+		ica = self.store.get_ica_file(self.stub.url(launch_path))
+		self.assertTrue('LogonTicket=TICKET42' in ica)
+		# the first launch request is answered with the challenge
+		self.assertEqual(len([r for r in self.stub.requests if r[0] == launch_path and r[1] != None]), 3)
+
+	def test_launch_retry_maximum(self):
+		self.stub.launches = [launch_retry_xml % ('0')] * 3
+		self.assertRaises(sessionapi.SessionApiError, self.store.get_ica_file, self.stub.url(launch_path), 2)
+
+	def test_launch_error(self):
+		self.stub.launches = [launch_error_xml]
+		try:
+			self.store.get_ica_file(self.stub.url(launch_path))
+			self.fail('launch error is not raised')
+		except sessionapi.SessionApiError as e:
+			self.assertTrue('NoMoreActiveSessions' in str(e))
+
+	def test_stop_session(self):
+		self.assertTrue(self.store.stop_session(['TICKET42']))
+		self.assertTrue('<ticket>TICKET42</ticket>' in self.stub.requests[-1][2])
+
+	def test_resume(self):
+		ica_path = self.resume()
+		self.assertEqual(len(FakePopen.calls), 1)
+		self.assertEqual(FakePopen.calls[0], ['wfica32.exe', ica_path])
+		self.assertTrue('LogonTicket=TICKET42' in open(ica_path).read())
+
+	def test_remove_ica(self):
+		ica_path = self.resume()
+		sessionapi.remove_ica(ica_path)
+		self.assertFalse(os.path.exists(ica_path))
+		# removed twice, only logged
+		sessionapi.remove_ica(ica_path)
+
+	def test_resume_no_session(self):
+		self.stub.sessions = []
+		self.assertFalse(self.resume())
+
+	def test_resume_no_launchica(self):
+		self.stub.sessions = ['<session><initialapp>rh73demo</initialapp></session>']
+		self.assertFalse(self.resume())
+
+	def test_resume_no_ica(self):
+		self.stub.launches = [launch_no_ica_xml]
+		self.assertFalse(self.resume())
+
+	def test_resume_bad_retry_after(self):
+		self.stub.launches = [launch_retry_xml % ('soon')]
+		self.assertFalse(self.resume())
+
+	def test_resume_bad_status_line(self):
+		self.stub.launches = [None]
+		self.assertFalse(self.resume())
+
+	def test_resume_malformed_xml(self):
+		self.stub.launches = ['<launch><status>success']
+		self.assertFalse(self.resume())
+
+	def test_resume_client_start_fails(self):
+		sessionapi.subprocess.Popen = FailingPopen
+		self.assertFalse(self.resume())
+		self.assertEqual(len(FakePopen.calls), 1)
+
+	def test_resume_store_down(self):
+		url = self.stub.url(store_path)
+		self.stub.stop()
+		self.assertFalse(sessionapi.resume(url, 'DOMAIN', 'user1', 'secret', 'rh73*'))
+
+
+if __name__ == "__main__":
+	unittest.main()